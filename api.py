@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from booking import holds, record, lookup_patient, search_slots, hold_slot, release_hold, book_for_intake, set_status
+from data_layer import cache, store
+from diagnostics import diag
+from holds import MAX_HOLD_TTL_SEC
+from reminders import default_engine, start_background
+from reports import admin_report
+from scheduling import FIRST_AVAILABLE_LIMIT, SLOT_STEP_MIN, SlotConflict, visit_duration, overlap_report
+
+# Minimal HTTP/1.1 + JSON front end for kiosks, phone agents and batch clients.
+# Connections are handled on the event loop; the blocking scheduling calls run on a
+# thread pool, so one process serves many concurrent clients.
+
+log = logging.getLogger("scheduler.api")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 1 << 20
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _json_default(v):
+    if isinstance(v, np.generic):
+        return v.item()
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return str(v)
+
+def _day(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def _when(value):
+    return datetime.fromisoformat(value)
+
+def _require(body, *fields):
+    missing = [f for f in fields if body.get(f) in (None, "")]
+    if missing:
+        raise HTTPError(400, f"missing fields: {', '.join(missing)}")
+
+def _slot_args(body):
+    _require(body, "doctor", "location", "date", "slot_start", "slot_end")
+    return body["doctor"], body["location"], _day(body["date"]), _when(body["slot_start"]), _when(body["slot_end"])
+
+def health(body, query):
+    return 200, {"ok": True, "storage": store.name}
+
+def patients_lookup(body, query):
+    _require(body, "first_name", "last_name", "dob")
+    existing, similar = lookup_patient(body["first_name"], body["last_name"], _day(body["dob"]))
+    return 200, {
+        "patient": record(existing),
+        "similar": [record(row) for _, row in similar.iterrows()],
+        "duration": visit_duration(existing is not None),
+    }
+
+def search(body, query):
+    # {"duration" | "is_returning", "date", "doctor", "location", "first_available", "end_date", "limit", "owner"}
+    duration = int(body.get("duration") or visit_duration(bool(body.get("is_returning"))))
+    if duration <= 0 or duration % SLOT_STEP_MIN:
+        raise HTTPError(400, f"duration must be a positive multiple of {SLOT_STEP_MIN} minutes")
+    first_available = bool(body.get("first_available"))
+    if first_available:
+        _require(body, "date")
+    else:
+        _require(body, "date", "doctor", "location")
+    slots = search_slots(
+        duration, _day(body["date"]), body.get("doctor"), body.get("location"), first_available,
+        _day(body["end_date"]) if body.get("end_date") else None,
+        _when(body["not_before"]) if body.get("not_before") else None,
+        int(body.get("limit") or FIRST_AVAILABLE_LIMIT),
+        body.get("owner"),
+    )
+    return 200, {"duration": duration, "slots": slots}
+
+def create_hold(body, query):
+    ttl = body.get("ttl")
+    if ttl is not None and (isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or not 0 < ttl <= MAX_HOLD_TTL_SEC):
+        raise HTTPError(400, f"ttl must be a positive number of seconds, at most {MAX_HOLD_TTL_SEC}")
+    result = hold_slot(*_slot_args(body), owner=body.get("owner"), ttl=ttl)
+    if isinstance(result, str):
+        return 409, {"status": result}
+    return 201, {"hold_id": result["hold_id"], "ttl": ttl or holds.ttl}
+
+def delete_hold(body, query, hold_id):
+    return 200, {"released": release_hold(hold_id)}
+
+def metrics(body, query):
+    return 200, {"holds": holds.stats(), "cache": cache.stats(), "diagnostics": diag.snapshot()}
+
+def metrics_prometheus(body, query):
+    return 200, diag.prometheus()
+
+def overlaps(body, query):
+    return 200, {"overlaps": [record(row) for row in overlap_report().to_dict("records")]}
+
+def create_appointment(body, query):
+    intake = body.get("intake") or {}
+    _require(intake, "first_name", "last_name", "dob")
+    intake = dict({k: "" for k in ("email", "phone", "city", "state", "zip", "insurance", "member_id", "group_no")}, **intake)
+    intake["dob"] = _day(intake["dob"])
+    try:
+        appt = book_for_intake(intake, *_slot_args(body), hold_id=body.get("hold_id"))
+    except SlotConflict as exc:
+        return 409, {"status": str(exc)}
+    return 201, {"status": "booked", "appointment": appt}
+
+def update_status(body, query, appointment_id):
+    _require(body, "status")
+    appt = set_status(appointment_id, body["status"], body.get("reason") or "")
+    if appt is None:
+        raise HTTPError(404, "no such appointment")
+    return 200, {"appointment": appt}
+
+def report(body, query):
+    # ?first=YYYY-MM&last=YYYY-MM; one list of rows per report table.
+    params = {k: v[-1] for k, v in parse_qs(query).items()}
+    tables = admin_report(params.get("first"), params.get("last"))
+    return 200, {name: [record(row) for row in table.to_dict("records")] for name, table in tables.items()}
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/metrics"): metrics,
+    ("GET", "/metrics/prometheus"): metrics_prometheus,
+    ("GET", "/audit/overlaps"): overlaps,
+    ("GET", "/reports"): report,
+    ("POST", "/patients/lookup"): patients_lookup,
+    ("POST", "/search"): search,
+    ("POST", "/holds"): create_hold,
+    ("POST", "/appointments"): create_appointment,
+}
+PREFIX_ROUTES = {("DELETE", "/holds/"): delete_hold, ("PATCH", "/appointments/"): update_status}
+
+def dispatch(method, target, raw):
+    url = urlsplit(target)
+    try:
+        body = json.loads(raw) if raw else {}
+    except ValueError:
+        raise HTTPError(400, "body is not valid JSON")
+    if not isinstance(body, dict):
+        raise HTTPError(400, "body must be a JSON object")
+    handler = ROUTES.get((method, url.path))
+    if handler is not None:
+        with diag.span(f"api.{handler.__name__}"):
+            return handler(body, url.query)
+    for (m, prefix), handler in PREFIX_ROUTES.items():
+        if url.path.startswith(prefix) and len(url.path) > len(prefix):
+            if m != method:
+                raise HTTPError(405, "method not allowed")
+            with diag.span(f"api.{handler.__name__}"):
+                return handler(body, url.query, url.path[len(prefix):])
+    if any(path == url.path for _, path in ROUTES):
+        raise HTTPError(405, "method not allowed")
+    raise HTTPError(404, "not found")
+
+def handle(method, target, raw):
+    try:
+        return dispatch(method, target, raw)
+    except HTTPError as exc:
+        return exc.status, {"error": str(exc)}
+    except (ValueError, TypeError, KeyError) as exc:
+        return 400, {"error": str(exc)}
+    except Exception:
+        log.exception("%s %s failed", method, target)
+        return 500, {"error": "internal error"}
+
+class Server:
+    def __init__(self, host="127.0.0.1", port=8765, workers=4):
+        self.host = host
+        self.port = port
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.server = None
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        # Text payloads (the Prometheus exposition) go out as-is, everything else as JSON.
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, default=_json_default).encode(), "application/json"
+        head = f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def _client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = headers.get("content-length") or "0"
+                if not length.isdecimal():
+                    await self._respond(writer, 400, {"error": "bad content-length"}, False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "body too large"}, False)
+                    break
+                raw = await reader.readexactly(length) if length else b""
+                status, payload = await loop.run_in_executor(self.pool, handle, method.upper(), target, raw)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._client, self.host, self.port, limit=MAX_BODY)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        log.info("scheduler API on http://%s:%s (storage: %s)", self.host, self.port, store.name)
+        async with self.server:
+            await self.server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the scheduling core over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="threads running scheduling calls")
+    parser.add_argument("--reminders-interval", type=float, default=0, help="send due forms and reminders every N seconds (0: off)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.reminders_interval > 0:
+        start_background(default_engine(), args.reminders_interval)
+        log.info("sending due reminders every %ss", args.reminders_interval)
+    try:
+        asyncio.run(Server(args.host, args.port, args.workers).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
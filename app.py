@@ -1,112 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime, date, timedelta
 import uuid
-from pathlib import Path
-
-DATA_DIR = Path("data")
-PATIENTS_CSV = DATA_DIR / "patients.csv"
-SCHEDULE_XLSX = DATA_DIR / "doctor_schedules.xlsx"
-APPTS_XLSX = DATA_DIR / "appointments.xlsx"
-
-NEW_MIN = 60
-RETURN_MIN = 30
-
-def load_patients():
-    if PATIENTS_CSV.exists():
-        df = pd.read_csv(PATIENTS_CSV)
-        if "dob" in df.columns:
-            df["dob"] = pd.to_datetime(df["dob"], errors="coerce").dt.date
-        return df
-    cols = ["patient_id","first_name","last_name","dob","email","phone","city","state","zip","insurance_carrier","member_id","group_number","is_returning"]
-    return pd.DataFrame(columns=cols)
-
-def load_schedules():
-    if SCHEDULE_XLSX.exists():
-        df = pd.read_excel(SCHEDULE_XLSX, engine="openpyxl")
-        df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
-        df["slot_start"] = pd.to_datetime(df["slot_start"], errors="coerce")
-        df["slot_end"] = pd.to_datetime(df["slot_end"], errors="coerce")
-        return df
-    cols = ["doctor","location","date","slot_start","slot_end","available"]
-    return pd.DataFrame(columns=cols)
-
-def load_appointments():
-    if APPTS_XLSX.exists():
-        df = pd.read_excel(APPTS_XLSX, engine="openpyxl")
-        if "appointment_date" in df.columns:
-            df["appointment_date"] = pd.to_datetime(df["appointment_date"], errors="coerce").dt.date
-        return df
-    cols = ["appointment_id","created_at","patient_id","patient_name","dob","email","phone","city","state","zip","doctor","location","visit_type","appointment_date","slot_start","slot_end","insurance_carrier","member_id","group_number","status","forms_sent","reminder_1","reminder_2","reminder_3","cancellation_reason"]
-    return pd.DataFrame(columns=cols)
-
-def save_patients(df):
-    df.to_csv(PATIENTS_CSV, index=False)
-
-def save_appointments(df):
-    df.to_excel(APPTS_XLSX, index=False, engine="openpyxl")
-
-def find_patient(df, first, last, dob):
-    if df.empty:
-        return None
-    mask = (
-        df["first_name"].astype(str).str.lower().str.strip() == str(first).strip().lower()
-    ) & (
-        df["last_name"].astype(str).str.lower().str.strip() == str(last).strip().lower()
-    ) & (
-        df["dob"] == dob
-    )
-    matches = df[mask]
-    if len(matches) >= 1:
-        return matches.iloc[0]
-    return None
-
-def visit_duration(is_returning):
-    return RETURN_MIN if is_returning else NEW_MIN
-
-def slots_for_doctor(df_sched, doctor, location, day, duration_min):
-    if df_sched.empty:
-        return []
-    day_df = df_sched[(df_sched["doctor"] == doctor) & (df_sched["location"] == location) & (df_sched["date"] == day)]
-    if day_df.empty:
-        return []
-    free = day_df[day_df["available"] == True].sort_values("slot_start")
-    suggestions = []
-    cur_start = None
-    cur_end = None
-    for _, row in free.iterrows():
-        s = row["slot_start"].to_pydatetime()
-        e = row["slot_end"].to_pydatetime()
-        if cur_start is None:
-            cur_start = s
-            cur_end = e
-        else:
-            if s == cur_end:
-                cur_end = e
-            else:
-                minutes = int((cur_end - cur_start).total_seconds() // 60)
-                if minutes >= duration_min:
-                    suggestions.append((cur_start.time(), cur_end.time()))
-                cur_start = s
-                cur_end = e
-    if cur_start is not None:
-        minutes = int((cur_end - cur_start).total_seconds() // 60)
-        if minutes >= duration_min:
-            suggestions.append((cur_start.time(), cur_end.time()))
-    return suggestions
-
-def book_slot(df_sched, doctor, location, day, start_dt, end_dt):
-    mask = (df_sched["doctor"] == doctor) & (df_sched["location"] == location) & (df_sched["date"] == day)
-    target = df_sched[mask]
-    for idx, row in target.iterrows():
-        s = row["slot_start"].to_pydatetime()
-        e = row["slot_end"].to_pydatetime()
-        if (s < end_dt) and (start_dt < e):
-            df_sched.at[idx, "available"] = False
-    df_sched.to_excel(SCHEDULE_XLSX, index=False, engine="openpyxl")
+from datetime import datetime, date
+from booking import STATUSES, holds, create_appointment, hold_slot, search_slots, set_status
+from data_layer import cache, store, load_patients, load_schedules, load_appointments, export_excel
+from diagnostics import diag
+from importer import import_file
+from reports import admin_report, to_workbook_bytes
+from reminders import default_engine, reminder_queue
+from rescheduling import reschedule_day
+from scheduling import CONFLICT, OVERLAP, SlotConflict, find_patient, similar_patients, visit_duration, providers, overlap_report
+from storage import to_excel_bytes
 
 st.set_page_config(page_title="RagaAI Scheduler", layout="wide")
+# Timings of this rerun; the Admin diagnostics panel shows the previous one.
+diag_run = diag.begin_rerun(f'step {st.session_state.get("wizard_step", 1)}', profile=st.session_state.get("profile_reruns", False))
 
 theme_css = """
 <style>
@@ -162,9 +71,11 @@ body {
 """
 st.markdown(theme_css, unsafe_allow_html=True)
 
-patients = load_patients()
-schedules = load_schedules()
-appts = load_appointments()
+with diag.span("app.load"):
+    patients = load_patients()
+    schedules = load_schedules()
+    appts = load_appointments()
+    doctors, locations = providers(schedules)
 
 if "wizard_step" not in st.session_state:
     st.session_state["wizard_step"] = 1
@@ -287,8 +198,8 @@ elif st.session_state["wizard_step"] == 5:
             go_next()
 elif st.session_state["wizard_step"] == 6:
     st.markdown('<div style="font-weight:600;font-size:16px;margin-bottom:6px">Preferred doctor and location</div>', unsafe_allow_html=True)
-    doctor = st.selectbox("Doctor", options=sorted(schedules["doctor"].unique()) if not schedules.empty else ["Dr. Rao"], key="doctor_select")
-    location = st.selectbox("Location", options=sorted(schedules["location"].unique()) if not schedules.empty else ["Main Clinic"], key="location_select")
+    doctor = st.selectbox("Doctor", options=doctors or ["Dr. Rao"], key="doctor_select")
+    location = st.selectbox("Location", options=locations or ["Main Clinic"], key="location_select")
     st.session_state["selected_doctor"] = doctor
     st.session_state["selected_location"] = location
     cols = st.columns([1,1])
@@ -300,96 +211,76 @@ elif st.session_state["wizard_step"] == 6:
             go_next()
 elif st.session_state["wizard_step"] == 7:
     st.markdown('<div style="font-weight:600;font-size:16px;margin-bottom:6px">Pick a date and slot</div>', unsafe_allow_html=True)
-    day = st.date_input("Appointment date", value=date.today(), min_value=min_calendar, max_value=max_calendar, key="appt_date")
-    doctor = st.session_state.get("selected_doctor", sorted(schedules["doctor"].unique())[0] if not schedules.empty else "Dr. Rao")
-    location = st.session_state.get("selected_location", sorted(schedules["location"].unique())[0] if not schedules.empty else "Main Clinic")
+    slot_mode = st.radio("Find a slot", ["Pick a date", "First available"], horizontal=True, key="slot_mode")
+    if slot_mode == "Pick a date":
+        day = st.date_input("Appointment date", value=min(date.today(), max_calendar), min_value=min_calendar, max_value=max_calendar, key="appt_date")
+    else:
+        any_provider = st.checkbox("Any doctor or location", key="any_provider")
+    doctor = st.session_state.get("selected_doctor", doctors[0] if doctors else "Dr. Rao")
+    location = st.session_state.get("selected_location", locations[0] if locations else "Main Clinic")
     is_ret = False
+    existing = None
     if st.session_state["intake"]["first_name"] and st.session_state["intake"]["last_name"] and st.session_state["intake"]["dob"]:
         existing = find_patient(patients, st.session_state["intake"]["first_name"], st.session_state["intake"]["last_name"], st.session_state["intake"]["dob"])
+        if existing is None:
+            similar = similar_patients(patients, st.session_state["intake"]["first_name"], st.session_state["intake"]["last_name"], st.session_state["intake"]["dob"])
+            similar = similar[similar["dob"] == st.session_state["intake"]["dob"]]
+            if not similar.empty:
+                choices = ["None of these"] + [f'{r["first_name"]} {r["last_name"]} · {r["dob"]}' for _, r in similar.iterrows()]
+                picked = st.radio("We found a similar record. Is one of these you?", choices, key="similar_patient")
+                if picked != choices[0]:
+                    existing = similar.iloc[choices.index(picked) - 1]
         if existing is not None:
             is_ret = True
     duration = visit_duration(is_ret)
     st.markdown(f'<div class="small-muted">Visit duration: {duration} minutes</div>', unsafe_allow_html=True)
-    if schedules.empty:
+    if not doctors:
         st.warning("No schedules available. Upload schedules in Admin")
     else:
-        suggestions = slots_for_doctor(schedules, doctor, location, day, duration)
-        if not suggestions:
-            st.error("No contiguous blocks available for chosen date")
+        # Slots other sessions hold are hidden; picking one holds it for this session
+        # until it is booked, another slot is picked or the hold times out.
+        owner = st.session_state.setdefault("hold_owner", str(uuid.uuid4()))
+        if slot_mode == "Pick a date":
+            found = search_slots(duration, day, doctor, location, owner=owner)
+        else:
+            found = search_slots(duration, min(date.today(), max_calendar), None if any_provider else doctor, None if any_provider else location, True, max_calendar, datetime.now(), owner=owner)
+        options = [(r["doctor"], r["location"], r["date"], r["slot_start"], r["slot_end"]) for r in found]
+        if not options:
+            st.error("No contiguous blocks available for chosen date" if slot_mode == "Pick a date" else "No open slots found up to the calendar limit")
         else:
-            options = []
-            for block_start, block_end in suggestions:
-                start_dt = datetime.combine(day, block_start)
-                end_dt_block = datetime.combine(day, block_end)
-                ptr = start_dt
-                while ptr + timedelta(minutes=duration) <= end_dt_block:
-                    options.append((ptr, ptr + timedelta(minutes=duration)))
-                    ptr += timedelta(minutes=30)
-            for i, o in enumerate(options):
-                start_str = o[0].strftime("%I:%M %p")
-                end_str = o[1].strftime("%I:%M %p")
-                col1, col2 = st.columns([3,1])
-                with col1:
-                    st.markdown(f'<div class="slot-card"><strong>{start_str} - {end_str}</strong><div class="small">Doctor: {doctor} · {location}</div></div>', unsafe_allow_html=True)
-                with col2:
-                    btn_key = f"book_{i}"
-                    if st.button("Book", key=btn_key):
-                        start_dt, end_dt = o
-                        if existing is None:
-                            new_patient = {
-                                "patient_id": str(uuid.uuid4()),
-                                "first_name": st.session_state["intake"]["first_name"],
-                                "last_name": st.session_state["intake"]["last_name"],
-                                "dob": st.session_state["intake"]["dob"],
-                                "email": st.session_state["intake"]["email"],
-                                "phone": st.session_state["intake"]["phone"],
-                                "city": st.session_state["intake"]["city"],
-                                "state": st.session_state["intake"]["state"],
-                                "zip": st.session_state["intake"]["zip"],
-                                "insurance_carrier": st.session_state["intake"]["insurance"],
-                                "member_id": st.session_state["intake"]["member_id"],
-                                "group_number": st.session_state["intake"]["group_no"],
-                                "is_returning": False
-                            }
-                            patients = pd.concat([patients, pd.DataFrame([new_patient])], ignore_index=True)
-                            save_patients(patients)
-                            patient_id = new_patient["patient_id"]
-                            patient_name = f'{new_patient["first_name"]} {new_patient["last_name"]}'
-                        else:
-                            patient_id = existing["patient_id"]
-                            patient_name = f'{existing["first_name"]} {existing["last_name"]}'
-                        book_slot(schedules, doctor, location, day, start_dt, end_dt)
-                        appt = {
-                            "appointment_id": str(uuid.uuid4()),
-                            "created_at": datetime.now(),
-                            "patient_id": patient_id,
-                            "patient_name": patient_name,
-                            "dob": st.session_state["intake"]["dob"],
-                            "email": st.session_state["intake"]["email"],
-                            "phone": st.session_state["intake"]["phone"],
-                            "city": st.session_state["intake"]["city"],
-                            "state": st.session_state["intake"]["state"],
-                            "zip": st.session_state["intake"]["zip"],
-                            "doctor": doctor,
-                            "location": location,
-                            "visit_type": "returning" if is_ret else "new",
-                            "appointment_date": day,
-                            "slot_start": start_dt,
-                            "slot_end": end_dt,
-                            "insurance_carrier": st.session_state["intake"]["insurance"],
-                            "member_id": st.session_state["intake"]["member_id"],
-                            "group_number": st.session_state["intake"]["group_no"],
-                            "status": "scheduled",
-                            "forms_sent": False,
-                            "reminder_1": "pending",
-                            "reminder_2": "pending",
-                            "reminder_3": "pending",
-                            "cancellation_reason": ""
-                        }
-                        appts = pd.concat([appts, pd.DataFrame([appt])], ignore_index=True)
-                        save_appointments(appts)
-                        st.success("Appointment booked")
-                        st.session_state["wizard_step"] = 8
+            with diag.span("render.slot_options"):
+                diag.count("widgets", 2 * len(options), "slot_options")
+                held = holds.held_by(owner)
+                for i, o in enumerate(options):
+                    start_str = o[3].strftime("%I:%M %p")
+                    end_str = o[4].strftime("%I:%M %p")
+                    day_str = o[2].strftime("%a %d %b %Y") + " · " if slot_mode == "First available" else ""
+                    is_held = held is not None and (held["doctor"], held["location"], held["date"], held["slot_start"], held["slot_end"]) == o
+                    held_str = f' · <span class="pill pill-green">Held for you, {max(0, int(held["expires"] - holds.clock())) // 60 + 1} min left</span>' if is_held else ""
+                    col1, col2 = st.columns([3,1])
+                    with col1:
+                        st.markdown(f'<div class="slot-card"><strong>{day_str}{start_str} - {end_str}</strong>{held_str}<div class="small">Doctor: {o[0]} · {o[1]}</div></div>', unsafe_allow_html=True)
+                    with col2:
+                        if not is_held:
+                            if st.button("Select", key=f"hold_{i}"):
+                                result = hold_slot(*o, owner=owner)
+                                if isinstance(result, str):
+                                    st.error("That slot was just taken, please pick another" if result == CONFLICT else "That slot is no longer on the schedule")
+                                else:
+                                    st.rerun()
+                        elif st.button("Book", key=f"book_{i}"):
+                            doctor, location, day, start_dt, end_dt = o
+                            try:
+                                create_appointment(st.session_state["intake"], doctor, location, day, start_dt, end_dt, existing, held["hold_id"], owner)
+                                appts = load_appointments()
+                            except SlotConflict as exc:
+                                if str(exc) == OVERLAP:
+                                    st.error("This patient already has an appointment at that time")
+                                else:
+                                    st.error("That slot was just taken, please pick another" if str(exc) == CONFLICT else "That slot is no longer on the schedule")
+                            else:
+                                st.success("Appointment booked")
+                                st.session_state["wizard_step"] = 8
     cols = st.columns([1,1])
     with cols[0]:
         if st.button("Back"):
@@ -420,24 +311,65 @@ st.markdown('<div class="card">', unsafe_allow_html=True)
 st.subheader("Admin")
 admin_cols = st.columns([2,1])
 with admin_cols[0]:
-    upload_pat = st.file_uploader("Replace patients.csv", type=["csv"])
-    if upload_pat is not None:
-        dfp = pd.read_csv(upload_pat)
-        if "dob" in dfp.columns:
-            dfp["dob"] = pd.to_datetime(dfp["dob"], errors="coerce").dt.date
-        dfp.to_csv(PATIENTS_CSV, index=False)
-        patients = load_patients()
-        st.success("Patients replaced")
-    upload_sched = st.file_uploader("Replace doctor_schedules.xlsx", type=["xlsx"])
-    if upload_sched is not None:
-        pd.read_excel(upload_sched, engine="openpyxl").to_excel(SCHEDULE_XLSX, index=False, engine="openpyxl")
-        schedules = load_schedules()
-        st.success("Schedules replaced")
+    for table, label in (("patients", "Import patients (csv or xlsx)"), ("schedules", "Import doctor schedules (xlsx or csv)"), ("schedule_rules", "Import weekly schedule templates and closures (xlsx or csv)")):
+        upload = st.file_uploader(label, type=["csv", "xlsx"], key=f"upload_{table}")
+        if upload is not None and st.session_state.get(f"imported_{table}") != upload.file_id:
+            bar = st.progress(0.0, text=f"Importing {table}")
+            summary = import_file(table, upload, upload.name, progress=lambda fraction, s, bar=bar: bar.progress(fraction or 0.0, text=f'{s["rows"]} rows read, {s["rejected"]} rejected'))
+            st.session_state[f"imported_{table}"] = upload.file_id
+            st.success(f'{summary["imported"]} {table} rows merged, {summary["rejected"]} rejected')
+    with st.expander("Cancel a doctor's day"):
+        if not doctors:
+            st.caption("No schedules loaded")
+        else:
+            cancel_doctor = st.selectbox("Doctor", doctors, key="cancel_doctor")
+            cancel_day = st.date_input("Day", value=min(date.today(), max_calendar), min_value=min_calendar, max_value=max_calendar, key="cancel_day")
+            cancel_any = st.checkbox("Move to any doctor", key="cancel_any")
+            if st.button("Close day and reschedule"):
+                try:
+                    result = reschedule_day(cancel_doctor, cancel_day, any_doctor=cancel_any)
+                except SlotConflict:
+                    st.error("Schedules changed while rescheduling, nothing was moved. Please try again")
+                else:
+                    st.success(f'{len(result["moved"])} appointments moved, {len(result["unplaced"])} without an open slot')
+                    if result["moved"]:
+                        st.dataframe(pd.DataFrame(result["moved"]), hide_index=True)
+                    if result["unplaced"]:
+                        st.warning("Not moved: " + ", ".join(result["unplaced"]))
+    with st.expander("Update appointment status"):
+        status_id = st.text_input("Appointment ID", key="status_id")
+        new_status = st.selectbox("Status", STATUSES, key="status_value")
+        status_reason = st.text_input("Cancellation reason", key="status_reason") if new_status == "cancelled" else ""
+        if st.button("Save status") and status_id.strip():
+            try:
+                updated = set_status(status_id.strip(), new_status, status_reason)
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                if updated is None:
+                    st.error("No appointment with that ID")
+                else:
+                    st.success(f'{updated["patient_name"]} · {updated["appointment_date"]}: {updated["status"]}')
+    with st.expander("Reports"):
+        # Rendered only when asked for, so other reruns do not pay for the rollup.
+        if st.checkbox("Show utilization report", key="show_report"):
+            report_cols = st.columns(2)
+            report_first = report_cols[0].text_input("From month (YYYY-MM)", key="report_first").strip() or None
+            report_last = report_cols[1].text_input("To month (YYYY-MM)", key="report_last").strip() or None
+            try:
+                tables = admin_report(report_first, report_last)
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                for name in ("By doctor", "By location", "By month"):
+                    st.markdown(f"**{name}**")
+                    st.dataframe(tables[name], hide_index=True)
+                if st.button("Export report.xlsx"):
+                    st.download_button("Download", data=to_workbook_bytes(tables), file_name=f'admin_report_{datetime.now().strftime("%Y%m%d%H%M%S")}.xlsx')
 with admin_cols[1]:
     if st.button("Download appointments.xlsx"):
-        if APPTS_XLSX.exists():
-            with open(APPTS_XLSX, "rb") as f:
-                st.download_button("Download", data=f.read(), file_name="appointments.xlsx")
+        st.download_button("Download", data=export_excel("appointments"), file_name="appointments.xlsx")
+    st.markdown(f'<div class="small-muted">Storage: {store.name}</div>', unsafe_allow_html=True)
     if st.button("Reset wizard"):
         st.session_state["wizard_step"] = 1
         st.session_state["intake"] = {
@@ -453,4 +385,41 @@ with admin_cols[1]:
             "member_id": "",
             "group_no": ""
         }
+    if st.button("Send due reminders"):
+        sent = default_engine().run_due()
+        st.success(f'{sent.get("sent", 0)} sent, {sent.get("failed", 0)} failed, {sent.get("skipped", 0)} skipped')
+    st.markdown(f'<div class="small-muted">Reminders queued: {reminder_queue(load_appointments()).pending()}</div>', unsafe_allow_html=True)
+    with st.expander("Data cache"):
+        st.json(cache.stats())
+    with st.expander("Slot holds"):
+        st.json(holds.stats())
+    with st.expander("Overlap audit"):
+        if st.button("Check for double bookings"):
+            report = overlap_report()
+            if report.empty:
+                st.success("No overlapping appointments")
+            else:
+                st.warning(f'{(report["kind"] == "doctor").sum()} doctor double bookings, {(report["kind"] == "patient").sum()} patient overlaps')
+                st.dataframe(report, hide_index=True)
+                st.download_button("Download overlaps.xlsx", data=to_excel_bytes(report), file_name="overlaps.xlsx")
+    with st.expander("Diagnostics"):
+        if st.checkbox("Show diagnostics", key="show_diagnostics"):
+            st.checkbox("Profile each rerun (cProfile)", key="profile_reruns")
+            last = st.session_state.get("last_rerun")
+            if last is not None:
+                st.markdown(f'<div class="small-muted">Previous rerun ({last["label"]}): {last["seconds"] * 1000:.0f} ms</div>', unsafe_allow_html=True)
+                st.dataframe(pd.DataFrame([{"at ms": sp["at_ms"], "span": "· " * sp["depth"] + sp["name"], "ms": sp["ms"]} for sp in last["spans"]]), hide_index=True)
+                st.json(last["counters"])
+                if last["profile"]:
+                    st.code(last["profile"])
+            snap = diag.snapshot()
+            st.markdown("**Since start**")
+            st.dataframe(pd.DataFrame.from_dict(snap["spans"], orient="index"))
+            st.json(snap["counters"])
+            if st.button("Append snapshot to metrics.jsonl"):
+                diag.write_jsonl()
+                st.success("Snapshot appended")
+            if st.button("Write Prometheus file"):
+                st.success(f"Written to {diag.write_prometheus()}")
 st.markdown('</div>', unsafe_allow_html=True)
+st.session_state["last_rerun"] = diag.end_rerun(diag_run)
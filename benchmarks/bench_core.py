@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+def measure(fn, args, before=None):
+    # Times fn(arg) for every arg, then runs the last one again under tracemalloc for
+    # the peak allocation of a single call.
+    samples = []
+    for arg in args[:-1]:
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+    if before is not None:
+        before()
+    tracemalloc.start()
+    fn(args[-1])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ms = np.array(samples or [0.0]) * 1000
+    return {"n": len(samples), "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)), "p99": float(np.percentile(ms, 99)), "max": float(ms.max()), "peak_kib": peak / 1024}
+
+def intake(rng, i):
+    first, last = rng.choice(["Ira", "Omar", "Zoya", "Kabir"]), rng.choice(["Bakshi", "Lal", "Sethi", "Tandon"])
+    return {
+        "first_name": first, "last_name": f"{last}{i}", "dob": datetime(1960, 1, 1).date() + timedelta(days=rng.randrange(15000)),
+        "email": f"{first.lower()}{i}@example.com", "phone": "9000000000", "city": "Pune", "state": "MH", "zip": "411001",
+        "insurance": "Aetna", "member_id": f"MBR{i:05d}", "group_no": "GRP100",
+    }
+
+def run_scale(scale, storage, queries, repeat, seed):
+    workdir = tempfile.mkdtemp(prefix="bench_core_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    os.environ["SCHEDULER_STORAGE"] = storage
+    os.environ["SCHEDULER_DB"] = os.path.join(workdir, "data", "scheduler.db")
+    import synthetic
+    import data_layer
+    from data_layer import cache, transaction, load_patients, load_schedules, load_appointments, save_patients, save_schedules, save_appointments, append_patient, append_appointment
+    from scheduling import BOOKED, find_patient, similar_patients, slots_for_doctor, slot_options, next_available, book_slot, visit_duration, patient_index, slot_index
+    from patient_index import PatientIndex
+    from slot_index import SlotIndex
+
+    t0 = time.perf_counter()
+    frames = dict(zip(["patients", "schedules", "appointments"], synthetic.dataset(scale, seed)))
+    generated = time.perf_counter() - t0
+    rng = random.Random(seed)
+    results = {}
+
+    saves = {"patients": save_patients, "schedules": save_schedules, "appointments": save_appointments}
+    loads = {"patients": load_patients, "schedules": load_schedules, "appointments": load_appointments}
+    for table, save in saves.items():
+        results[f"save_{table}"] = measure(lambda _: save(frames[table].copy()), range(repeat + 1))
+    for table, load in loads.items():
+        results[f"load_{table}"] = measure(lambda _: load(), range(repeat + 1), before=lambda: cache.bump(table))
+        results[f"load_{table} (cached)"] = measure(lambda _: load(), range(queries + 1))
+
+    patients = load_patients()
+    schedules = load_schedules()
+    results["index patients"] = measure(lambda _: PatientIndex.from_frame(patients), range(repeat + 1))
+    results["index schedules"] = measure(lambda _: SlotIndex.from_frame(schedules), range(repeat + 1))
+    patient_index(patients)
+    keys = list(slot_index(schedules).keys())
+
+    known = [patients.loc[rng.choice(patients.index)] for _ in range(queries + 1)]
+    results["find_patient"] = measure(lambda p: find_patient(patients, p["first_name"], p["last_name"], p["dob"]), known)
+    strangers = [intake(rng, i) for i in range(queries + 1)]
+    results["similar_patients"] = measure(lambda p: similar_patients(patients, p["first_name"], p["last_name"], p["dob"]), strangers)
+    days = [rng.choice(keys) for _ in range(queries + 1)]
+    results["slots_for_doctor"] = measure(lambda k: slots_for_doctor(schedules, *k, 60), days)
+    results["slot_options"] = measure(lambda k: slot_options(schedules, *k, 60), days)
+    first_day = min(k[2] for k in keys)
+    results["next_available"] = measure(lambda k: next_available(schedules, 60, first_day, doctor=k[0]), days)
+
+    statuses = {}
+
+    def book(k):
+        doctor, location, day = k
+        options = slot_options(schedules, doctor, location, day, 30)
+        if options:
+            start, end = rng.choice(options)
+            status = book_slot(schedules, doctor, location, day, start, end)
+            statuses[status] = statuses.get(status, 0) + 1
+    results["book_slot"] = measure(book, [rng.choice(keys) for _ in range(queries + 1)])
+
+    def wizard(i):
+        # Step 7 of the wizard for a new patient: lookup, near-duplicate check, options, booking.
+        form = intake(rng, i)
+        existing = find_patient(load_patients(), form["first_name"], form["last_name"], form["dob"])
+        if existing is None:
+            similar_patients(load_patients(), form["first_name"], form["last_name"], form["dob"])
+        duration = visit_duration(existing is not None)
+        sched = load_schedules()
+        doctor, location, day = rng.choice(keys)
+        options = slot_options(sched, doctor, location, day, duration)
+        if not options:
+            return
+        start, end = options[0]
+        with transaction():
+            status = book_slot(sched, doctor, location, day, start, end)
+            statuses[f"wizard {status}"] = statuses.get(f"wizard {status}", 0) + 1
+            if status != BOOKED:
+                return
+            patient_id = str(uuid.uuid4())
+            append_patient({"patient_id": patient_id, "first_name": form["first_name"], "last_name": form["last_name"], "dob": form["dob"], "email": form["email"], "phone": form["phone"], "city": form["city"], "state": form["state"], "zip": form["zip"], "insurance_carrier": form["insurance"], "member_id": form["member_id"], "group_number": form["group_no"], "is_returning": False})
+            append_appointment({"appointment_id": str(uuid.uuid4()), "created_at": datetime.now(), "patient_id": patient_id, "patient_name": f'{form["first_name"]} {form["last_name"]}', "dob": form["dob"], "email": form["email"], "phone": form["phone"], "doctor": doctor, "location": location, "visit_type": "new", "appointment_date": day, "slot_start": start, "slot_end": end, "status": "scheduled", "forms_sent": False, "reminder_1": "pending", "reminder_2": "pending", "reminder_3": "pending", "cancellation_reason": ""})
+    results["wizard booking"] = measure(wizard, range(queries + 1))
+
+    return {
+        "scale": scale, "storage": data_layer.store.name, "generate_seconds": generated,
+        "rows": {k: len(v) for k, v in frames.items()}, "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "statuses": statuses, "ops": results,
+    }
+
+def report(result):
+    print(f"\nscale={result['scale']} storage={result['storage']} rows={result['rows']} generated in {result['generate_seconds']:.2f}s, max RSS {result['max_rss_mib']:.0f} MiB")
+    print(f"{'operation':28s} {'n':>5s} {'p50 ms':>10s} {'p95 ms':>10s} {'p99 ms':>10s} {'max ms':>10s} {'peak KiB':>10s}")
+    for name, r in result["ops"].items():
+        print(f"{name:28s} {r['n']:5d} {r['p50']:10.3f} {r['p95']:10.3f} {r['p99']:10.3f} {r['max']:10.3f} {r['peak_kib']:10.0f}")
+    print(f"booking outcomes: {result['statuses']}")
+
+def regressions(results, baseline, tolerance, floor_ms=0.05):
+    # p95 slower than baseline * tolerance; sub-floor timings are too noisy to compare.
+    base = {(r["scale"], r["storage"], op): v["p95"] for r in baseline for op, v in r["ops"].items()}
+    found = []
+    for r in results:
+        for op, v in r["ops"].items():
+            old = base.get((r["scale"], r["storage"], op))
+            if old is not None and v["p95"] > max(old, floor_ms) * tolerance:
+                found.append(f"scale={r['scale']} {op}: p95 {old:.3f}ms -> {v['p95']:.3f}ms")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles and memory of the scheduler core at increasing data sizes")
+    parser.add_argument("--scales", default="1000,10000", help="comma separated, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "excel"])
+    parser.add_argument("--queries", type=int, default=200, help="samples per lookup/booking operation")
+    parser.add_argument("--repeat", type=int, default=3, help="samples per full-table operation (load/save/index build)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run; exit 1 if any p95 regressed")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one is not None:
+        print(json.dumps(run_scale(args.one, args.storage, args.queries, args.repeat, args.seed)))
+        return
+    results = []
+    for scale in [int(s) for s in args.scales.split(",")]:
+        # One process per scale so module-level caches and peak RSS do not carry over.
+        cmd = [sys.executable, __file__, "--one", str(scale), "--storage", args.storage, "--queries", str(args.queries), "--repeat", str(args.repeat), "--seed", str(args.seed)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+        report(results[-1])
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the timing spans and counters on the slot search path, on vs off")
+    parser.add_argument("--scale", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=3000)
+    args = parser.parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="bench_diagnostics_"))
+    os.chdir(workdir)
+    os.makedirs("data")
+    os.environ["SCHEDULER_DB"] = str(workdir / "data" / "scheduler.db")
+    import synthetic
+    synthetic.write_dataset("data", dict(zip(["patients", "schedules", "appointments"], synthetic.dataset(args.scale))), "sqlite")
+    from booking import search_slots
+    from data_layer import load_schedules
+    from diagnostics import diag
+    df = load_schedules()
+    days = sorted(set(df["date"]))
+    doctors = sorted(set(df["doctor"]))
+    rng = random.Random(1)
+    picks = [(rng.choice(doctors), rng.choice(days)) for _ in range(args.queries)]
+    search_slots(30, days[0], first_available=True)
+
+    def run():
+        t0 = time.perf_counter()
+        for doctor, day in picks:
+            search_slots(30, day, doctor, "Main Clinic")
+            search_slots(60, day, first_available=True, end_day=day + timedelta(days=7), limit=5)
+        return (time.perf_counter() - t0) / len(picks)
+
+    timings = {}
+    for enabled in (False, True, False, True):
+        diag.enabled = enabled
+        timings.setdefault(enabled, []).append(run())
+    off, on = min(timings[False]), min(timings[True])
+    t0 = time.perf_counter()
+    for _ in range(100000):
+        with diag.span("bench.empty"):
+            pass
+    span_us = (time.perf_counter() - t0) / 100000 * 1e6
+    print(f"scale={args.scale} queries={args.queries}")
+    print(f"search pair: off {off * 1000:.3f}ms, on {on * 1000:.3f}ms ({(on - off) / off * 100:+.1f}%)")
+    print(f"empty span {span_us:.2f}us")
+    print(f"spans recorded: {len(diag.snapshot()['spans'])}, counters: {diag.snapshot()['counters']}")
+
+if __name__ == "__main__":
+    main()
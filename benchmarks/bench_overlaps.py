@@ -0,0 +1,69 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import synthetic
+from booked_index import BookedIntervals
+
+def scan_conflicts(df, starts, ends, doctor, patient_id, start, end):
+    # What a check without the index has to do: filter the whole appointments frame.
+    hit = (starts < end) & (ends > start) & (df["status"] != "cancelled")
+    return {"doctor": df.index[hit & (df["doctor"] == doctor)].tolist(), "patient": df.index[hit & (df["patient_id"] == patient_id)].tolist()}
+
+def scan_overlaps(df, starts, ends):
+    # Pairwise self-join per doctor, the naive audit.
+    pairs = 0
+    active = df["status"] != "cancelled"
+    for _, group in df[active].groupby("doctor"):
+        s, e = starts[group.index].to_numpy(), ends[group.index].to_numpy()
+        pairs += int(((s[:, None] < e[None, :]) & (s[None, :] < e[:, None])).sum() - len(s)) // 2
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking-time overlap checks and the double-booking audit: frame scans vs the interval index")
+    parser.add_argument("--scale", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    _, _, df = synthetic.dataset(args.scale)
+    starts, ends = pd.to_datetime(df["slot_start"]), pd.to_datetime(df["slot_end"])
+    rng = random.Random(3)
+    picks = [df.iloc[rng.randrange(len(df))] for _ in range(args.queries)]
+    picks = [(r["doctor"], r["patient_id"], pd.Timestamp(r["slot_start"]).to_pydatetime(), pd.Timestamp(r["slot_end"]).to_pydatetime()) for r in picks]
+
+    t0 = time.perf_counter()
+    booked = BookedIntervals.from_frame(df)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for doctor, patient_id, start, end in picks:
+        booked.conflicts(doctor, patient_id, start, end)
+    indexed = (time.perf_counter() - t0) / len(picks)
+    sample = picks[:max(1, len(picks) // 20)]
+    t0 = time.perf_counter()
+    for doctor, patient_id, start, end in sample:
+        expected = scan_conflicts(df, starts, ends, doctor, patient_id, start, end)
+        found = booked.conflicts(doctor, patient_id, start, end)
+        if sorted(found["doctor"]) != sorted(expected["doctor"]) or sorted(found["patient"]) != sorted(expected["patient"]):
+            sys.exit(f"index disagrees with a scan for {doctor} {start}")
+    scanned = (time.perf_counter() - t0) / len(sample)
+
+    t0 = time.perf_counter()
+    pairs = booked.overlaps()
+    audit = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    naive_pairs = scan_overlaps(df, starts, ends)
+    naive = time.perf_counter() - t0
+    doctor_pairs = sum(kind == "doctor" for kind, *_ in pairs)
+    if doctor_pairs != naive_pairs:
+        sys.exit(f"audit found {doctor_pairs} doctor double bookings, the self-join {naive_pairs}")
+
+    print(f"scale={args.scale} appointments={len(df)} index build {build * 1000:.0f}ms")
+    print(f"conflict check: scan {scanned * 1e6:.0f}us, index {indexed * 1e6:.1f}us ({scanned / indexed:.0f}x)")
+    print(f"audit: self-join {naive:.3f}s, sweep {audit:.3f}s; {doctor_pairs} doctor double bookings, {len(pairs) - doctor_pairs} patient overlaps")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def synthetic_appointments(n, now, seed=3):
+    rng = np.random.default_rng(seed)
+    starts = pd.Timestamp(now).floor("30min") + pd.to_timedelta(rng.integers(1, 14 * 48, n) * 30, unit="m")
+    return pd.DataFrame({
+        "appointment_id": [str(uuid.uuid4()) for _ in range(n)],
+        "created_at": starts - pd.to_timedelta(rng.integers(1, 30 * 24, n), unit="h"),
+        "patient_id": [f"P{i:07d}" for i in range(n)],
+        "patient_name": "Test Patient",
+        "email": "patient@example.com",
+        "phone": "9000000000",
+        "doctor": rng.choice(["Dr. Rao", "Dr. Iyer", "Dr. Menon"], n),
+        "location": "Main Clinic",
+        "visit_type": "new",
+        "appointment_date": starts.date,
+        "slot_start": starts,
+        "slot_end": starts + pd.Timedelta(minutes=30),
+        "status": np.where(rng.random(n) < 0.05, "cancelled", "scheduled"),
+        "forms_sent": False,
+        "reminder_1": "pending",
+        "reminder_2": "pending",
+        "reminder_3": "pending",
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure reminder dispatch throughput on a synthetic appointment set")
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated send latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "excel"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_reminders_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    os.environ["SCHEDULER_STORAGE"] = args.storage
+    os.environ["SCHEDULER_DB"] = os.path.join(workdir, "data", "scheduler.db")
+    import data_layer
+    from reminders import ReminderEngine, MockSender, reminder_queue
+
+    now = datetime(2025, 9, 6, 8, 0)
+    data_layer.save_appointments(synthetic_appointments(args.appointments, now))
+    queue = reminder_queue(data_layer.load_appointments())
+    sender = MockSender(latency=args.latency, failure_rate=args.failure_rate, seed=1)
+    engine = ReminderEngine(sender, workers=args.workers, backoff=0.001, batch_size=2000)
+    result = engine.run_due(now + timedelta(days=7))
+    engine.close()
+
+    data_layer.cache.bump()
+    stored = data_layer.load_appointments()
+    handled = result.get("sent", 0) + result.get("failed", 0)
+    print(f"appointments={args.appointments} queued={len(queue.due)} remaining={queue.pending()}")
+    print(f"run={ {k: (round(v, 2) if isinstance(v, float) else v) for k, v in result.items()} } retries={engine.stats['retries']}")
+    print(f"throughput={handled / result['seconds']:.0f} reminders/s (dispatch + bulk status writes)")
+    print(f"stored statuses: {stored['reminder_1'].value_counts().to_dict()} forms_sent={int(stored['forms_sent'].sum())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import synthetic
+from reports import AppointmentStats, ScheduleCapacity, report_tables, rollup
+
+def timed(fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Admin report after a status change: recompute from the frames vs incremental counters")
+    parser.add_argument("--scale", type=int, default=400000)
+    parser.add_argument("--changes", type=int, default=200)
+    args = parser.parse_args()
+    _, df_sched, df = synthetic.dataset(args.scale)
+    capacity = ScheduleCapacity.from_frame(df_sched)
+    stats, build = timed(lambda: AppointmentStats.from_frame(df))
+
+    def recompute():
+        return report_tables(rollup(AppointmentStats.from_frame(df), ScheduleCapacity.from_frame(df_sched)))
+    _, full = timed(recompute, 3)
+
+    rng = random.Random(5)
+    labels = [df.index[rng.randrange(len(df))] for _ in range(args.changes)]
+    t0 = time.perf_counter()
+    for i, label in enumerate(labels):
+        df.loc[label, "status"] = ["cancelled", "no_show", "confirmed"][i % 3]
+        stats.update_rows(df, [label], ["status"])
+    update = (time.perf_counter() - t0) / len(labels)
+    _, render = timed(lambda: report_tables(rollup(stats, capacity)), 3)
+    if stats.totals != AppointmentStats.from_frame(df).totals:
+        sys.exit("incremental counters drifted from a rebuild")
+
+    print(f"scale={args.scale} appointments={len(df)} schedule rows={len(df_sched)} counter keys={len(stats.totals)}")
+    print(f"initial build {build:.3f}s")
+    print(f"report by recomputing from the frames {full * 1000:.0f}ms")
+    print(f"status change {update * 1e6:.0f}us + report from counters {render * 1000:.0f}ms ({full / render:.0f}x)")
+
+if __name__ == "__main__":
+    main()
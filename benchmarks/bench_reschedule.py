@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+import synthetic
+
+def main():
+    parser = argparse.ArgumentParser(description="Cancel the busiest doctor-days of a synthetic dataset and bulk-reschedule their appointments")
+    parser.add_argument("--scale", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=1000, help="doctor-days to cancel")
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "excel"])
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_reschedule_"))
+    os.chdir(workdir)
+    frames = dict(zip(["patients", "schedules", "appointments"], synthetic.dataset(args.scale)))
+    synthetic.write_dataset(workdir / "data", frames, args.storage if args.storage == "sqlite" else "xlsx")
+    os.environ["SCHEDULER_STORAGE"] = args.storage
+    os.environ["SCHEDULER_DB"] = str(workdir / "data" / "scheduler.db")
+    import data_layer
+    from booking import search_slots, set_status
+    from rescheduling import reschedule, reschedule_day, appointments_for_day
+    from scheduling import slot_index
+
+    appts = data_layer.load_appointments()
+    index = slot_index(data_layer.load_schedules())
+    busiest = appts[appts["status"] != "cancelled"].groupby(["doctor", "appointment_date"]).size().sort_values(ascending=False).index[:args.days]
+    labels = [label for doctor, day in busiest for label in appointments_for_day(appts, doctor, day)]
+    cancelled = set(busiest)
+    close = [key for key in index.keys() if (key[0], key[2]) in cancelled]
+
+    t0 = time.perf_counter()
+    result = reschedule(labels, min(day for _, day in busiest), doctor="*", close=close)
+    elapsed = time.perf_counter() - t0
+
+    data_layer.cache.bump()
+    stored = data_layer.load_appointments()
+    active = stored[stored["status"] != "cancelled"].sort_values(["doctor", "location", "slot_start"])
+    same = (active["doctor"].shift() == active["doctor"]) & (active["location"].shift() == active["location"])
+    overlaps = int((same & (active["slot_start"] < active["slot_end"].shift())).sum())
+    left = sum(len(appointments_for_day(stored, doctor, day)) for doctor, day in busiest)
+
+    # Cancelling an appointment left on a closed day must not reopen its slot.
+    doctor, day = next(key for key in stored[stored["status"] != "cancelled"].groupby(["doctor", "appointment_date"]).size().sort_values(ascending=False).index if key not in cancelled)
+    stranded = reschedule_day(doctor, day, start_day=day, end_day=day)["unplaced"]
+    reopened = 0
+    if stranded:
+        set_status(stranded[0], "cancelled", "bench")
+        data_layer.cache.bump()
+        sched = data_layer.load_schedules()
+        reopened = int((sched["available"] & (sched["doctor"] == doctor) & (sched["date"] == day)).sum())
+        reopened += len(search_slots(30, day, doctor, first_available=True, end_day=day))
+    print(f"scale={args.scale} storage={args.storage} cancelled doctor-days={len(close)} appointments={len(labels)}")
+    print(f"moved={len(result['moved'])} unplaced={len(result['unplaced'])} in {elapsed:.2f}s ({len(result['moved']) / elapsed:.0f} moves/s, one transaction)")
+    print(f"overlapping appointments={overlaps} still on cancelled days={left - len(result['unplaced'])}")
+    print(f"closed {doctor} {day}: {len(stranded)} unplaced, slots reopened by a cancellation={reopened}")
+    if overlaps or reopened:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
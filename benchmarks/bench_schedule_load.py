@@ -0,0 +1,93 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+def rss_mib(field="VmRSS"):
+    # VmHWM (peak) rather than ru_maxrss, which Linux carries over from the parent across exec.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+
+def load_one(mode, workdir):
+    # Runs in its own process. Both modes import and warm up both readers on a tiny file
+    # first, so the processes differ only in how the real table is loaded.
+    os.chdir(workdir)
+    import pandas as pd
+    from compact_schedule import CompactSchedule
+    from scheduling import slot_index
+    from storage import ExcelStorage
+    stamp = ExcelStorage().stamp("schedules")
+    pd.read_excel(Path("data") / "warmup.xlsx", engine="openpyxl")
+    CompactSchedule.load(Path("data") / "warmup.npz", None).to_frame()
+    gc.collect()
+    before = rss_mib()
+    t0 = time.perf_counter()
+    if mode == "openpyxl":
+        df = ExcelStorage().read("schedules")
+    else:
+        df = CompactSchedule.load(Path("data") / "schedules.npz", stamp).to_frame()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    loaded = rss_mib()
+    peak = rss_mib("VmHWM")
+    t0 = time.perf_counter()
+    index = slot_index(df)
+    indexed = time.perf_counter() - t0
+    return {
+        "mode": mode, "rows": len(df), "load_seconds": elapsed, "index_seconds": indexed, "days": len(index.days),
+        "start_mib": before, "rss_mib": loaded, "peak_mib": peak, "frame_mib": df.memory_usage(deep=True).sum() / 2**20,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold load of the schedule table: openpyxl parse vs the compact .npz snapshot")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--one", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.one:
+        print(json.dumps(load_one(*args.one)))
+        return
+
+    import synthetic
+    from compact_schedule import CompactSchedule
+    from storage import ExcelStorage
+    workdir = Path(tempfile.mkdtemp(prefix="bench_schedule_load_"))
+    os.chdir(workdir)
+    os.makedirs("data")
+    df = synthetic.schedules(args.rows)
+    df.loc[np.random.default_rng(0).random(len(df)) < 0.3, "available"] = False
+    storage = ExcelStorage()
+    t0 = time.perf_counter()
+    storage.write("schedules", df)
+    print(f"rows={args.rows} wrote xlsx in {time.perf_counter() - t0:.2f}s ({(Path('data') / 'doctor_schedules.xlsx').stat().st_size / 2**20:.1f} MiB)")
+    df.head(16).to_excel(Path("data") / "warmup.xlsx", index=False, engine="openpyxl")
+    CompactSchedule.from_frame(df.head(16)).save(Path("data") / "warmup.npz", None)
+    compact = CompactSchedule.from_frame(storage.read("schedules"))
+    compact.save(Path("data") / "schedules.npz", storage.stamp("schedules"))
+    print(f"compact arrays {compact.nbytes / 2**20:.2f} MiB, snapshot {(Path('data') / 'schedules.npz').stat().st_size / 2**20:.2f} MiB")
+
+    results = []
+    for mode in ("openpyxl", "snapshot"):
+        out = subprocess.run([sys.executable, __file__, "--one", mode, str(workdir)], check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    print(f"{'mode':10s} {'load s':>9s} {'index s':>9s} {'RSS before':>11s} {'RSS after':>10s} {'peak RSS':>9s} {'frame MiB':>10s}")
+    for r in results:
+        print(f"{r['mode']:10s} {r['load_seconds']:9.3f} {r['index_seconds']:9.3f} {r['start_mib']:11.1f} {r['rss_mib']:10.1f} {r['peak_mib']:9.1f} {r['frame_mib']:10.1f}")
+    base, snap = results
+    print(f"load {base['load_seconds'] / snap['load_seconds']:.0f}x faster; peak RSS growth {base['peak_mib'] - base['start_mib']:.1f} -> {snap['peak_mib'] - snap['start_mib']:.1f} MiB; frame {base['frame_mib']:.1f} -> {snap['frame_mib']:.1f} MiB")
+    if base["days"] != snap["days"]:
+        sys.exit("snapshot produced a different slot index")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from slot_index import SlotIndex
+from slot_engine import batch_candidate_starts
+
+def synthetic_schedules(doctors, days, seed=7):
+    rng = np.random.default_rng(seed)
+    rows = []
+    base = date(2025, 9, 1)
+    for d in range(doctors):
+        for k in range(days):
+            day = base + timedelta(days=k)
+            t = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+            for _ in range(16):
+                rows.append((f"Dr. {d:04d}", "Main Clinic", day, t, t + timedelta(minutes=30)))
+                t += timedelta(minutes=30)
+    df = pd.DataFrame(rows, columns=["doctor","location","date","slot_start","slot_end"])
+    df["available"] = rng.random(len(df)) > 0.3
+    return df
+
+def legacy_options(df_sched, doctor, location, day, duration):
+    day_df = df_sched[(df_sched["doctor"] == doctor) & (df_sched["location"] == location) & (df_sched["date"] == day)]
+    free = day_df[day_df["available"] == True].sort_values("slot_start")
+    blocks = []
+    cur_start = cur_end = None
+    for _, row in free.iterrows():
+        s = row["slot_start"].to_pydatetime()
+        e = row["slot_end"].to_pydatetime()
+        if cur_start is None:
+            cur_start, cur_end = s, e
+        elif s == cur_end:
+            cur_end = e
+        else:
+            if (cur_end - cur_start) >= timedelta(minutes=duration):
+                blocks.append((cur_start, cur_end))
+            cur_start, cur_end = s, e
+    if cur_start is not None and (cur_end - cur_start) >= timedelta(minutes=duration):
+        blocks.append((cur_start, cur_end))
+    options = []
+    for block_start, block_end in blocks:
+        ptr = block_start
+        while ptr + timedelta(minutes=duration) <= block_end:
+            options.append((ptr, ptr + timedelta(minutes=duration)))
+            ptr += timedelta(minutes=30)
+    return options
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat, out
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy slot expansion with the NumPy slot engine")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--duration", type=int, default=60)
+    args = parser.parse_args()
+
+    df = synthetic_schedules(args.doctors, args.days)
+    t0 = time.perf_counter()
+    index = SlotIndex.from_frame(df)
+    build = time.perf_counter() - t0
+    keys = list(index.keys())
+    rng = np.random.default_rng(1)
+    sample = [keys[i] for i in rng.integers(0, len(keys), args.queries)]
+
+    legacy_t, legacy_out = timed(lambda: [legacy_options(df, *k, args.duration) for k in sample], 1)
+    engine_t, engine_out = timed(lambda: [index.get(*k).candidates(args.duration) for k in sample], 3)
+    assert legacy_out == engine_out, "engine and legacy results differ"
+    all_days = [index.days[k] for k in keys]
+    batch_t, (day_pos, _, _) = timed(lambda: batch_candidate_starts(all_days, args.duration), 3)
+
+    print(f"rows={len(df)} doctor_days={len(keys)} index_build={build * 1000:.1f}ms")
+    print(f"legacy  per query: {legacy_t / args.queries * 1e6:10.1f} us")
+    print(f"engine  per query: {engine_t / args.queries * 1e6:10.1f} us  ({legacy_t / engine_t:.0f}x)")
+    print(f"batch   all {len(keys)} doctor-days: {batch_t * 1000:.1f} ms, {len(day_pos)} candidate starts")
+
+if __name__ == "__main__":
+    main()
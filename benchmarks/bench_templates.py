@@ -0,0 +1,86 @@
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from booked_index import BookedIntervals
+from schedule_rules import ScheduleRules
+from slot_index import SlotIndex
+from storage import SCHEDULE_COLS, APPT_COLS
+
+START = date(2025, 9, 1)
+
+def weekly_rules(doctors, holidays):
+    rows = [{"kind": "weekly", "doctor": f"Dr. {d:04d}", "location": "Main Clinic", "weekday": w, "start_time": "09:00", "end_time": "17:00", "slot_min": 30} for d in range(doctors) for w in range(5)]
+    rows += [{"kind": "closed", "date_from": day, "note": "holiday"} for day in holidays]
+    return pd.DataFrame(rows)
+
+def explicit_rows(doctors, days, holidays):
+    # The same calendar written out a row per slot, as doctor_schedules.xlsx needs it.
+    dates = [START + timedelta(days=k) for k in range(days)]
+    dates = [d for d in dates if d.weekday() < 5 and d not in holidays]
+    day = np.repeat(np.array(dates, dtype="datetime64[D]"), 16)
+    starts = day.astype("datetime64[s]") + np.timedelta64(9, "h") + np.tile(np.arange(16), len(dates)) * np.timedelta64(30, "m")
+    frames = []
+    for d in range(doctors):
+        frames.append(pd.DataFrame({
+            "doctor": f"Dr. {d:04d}", "location": "Main Clinic", "date": pd.to_datetime(day).date,
+            "slot_start": starts, "slot_end": starts + np.timedelta64(30, "m"), "available": True,
+        }, columns=SCHEDULE_COLS))
+    return pd.concat(frames, ignore_index=True)
+
+def timed(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def queries(index, doctors, days, n, seed):
+    rng = random.Random(seed)
+    picks = [(f"Dr. {rng.randrange(doctors):04d}", START + timedelta(days=rng.randrange(days))) for _ in range(n)]
+    t0 = time.perf_counter()
+    for doctor, day in picks:
+        day_slots = index.get(doctor, "Main Clinic", day)
+        if day_slots is not None:
+            day_slots.candidates(60)
+    options = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for doctor, day in picks:
+        index.search(60, day, None, doctor, "Main Clinic", 10)
+    search = (time.perf_counter() - t0) / n
+    return options, search
+
+def main():
+    parser = argparse.ArgumentParser(description="A year of clinic schedules as explicit slot rows vs weekly templates expanded on demand")
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    holidays = {date(2025, 10, 2), date(2025, 12, 25), date(2026, 1, 26)}
+    empty = BookedIntervals.from_frame(pd.DataFrame(columns=APPT_COLS))
+
+    df_rules = weekly_rules(args.doctors, holidays)
+    rules, rules_s, rules_peak = timed(lambda: ScheduleRules.from_frame(df_rules))
+    generated = SlotIndex({})
+    generated.use_rules(rules, lambda: empty)
+    df_rows, build_s, _ = timed(lambda: explicit_rows(args.doctors, args.days, holidays))
+    listed, listed_s, listed_peak = timed(lambda: SlotIndex.from_frame(df_rows))
+
+    print(f"doctors={args.doctors} days={args.days}")
+    print(f"{'':10s} {'rows':>10s} {'build s':>9s} {'peak MiB':>9s} {'options ms':>11s} {'search ms':>10s}")
+    for name, index, rows, seconds, peak in (("slot rows", listed, len(df_rows), listed_s, listed_peak), ("templates", generated, len(df_rules), rules_s, rules_peak)):
+        options, search = queries(index, args.doctors, args.days, args.queries, 7)
+        print(f"{name:10s} {rows:10d} {seconds:9.3f} {peak / 2**20:9.1f} {options * 1000:11.3f} {search * 1000:10.3f}")
+    print(f"template days expanded by the queries: {sum(v is not None for v in generated._generated.values())}")
+
+if __name__ == "__main__":
+    main()
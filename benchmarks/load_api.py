@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+import synthetic
+
+class Client:
+    # One keep-alive connection speaking just enough HTTP/1.1 for the scheduler API.
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(host, port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("API server exited during startup")
+        try:
+            client = Client(host, port)
+            status, _ = await client.request("GET", "/health")
+            await client.close()
+            if status == 200:
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise SystemExit("API server did not start")
+
+async def run_clients(host, port, keys, clients, bookings, seed):
+    latencies = defaultdict(list)
+    outcomes = Counter()
+    todo = iter(range(bookings))
+
+    async def call(client, name, method, path, payload=None):
+        t0 = time.perf_counter()
+        status, body = await client.request(method, path, payload)
+        latencies[name].append(time.perf_counter() - t0)
+        return status, body
+
+    async def worker(n):
+        rng = random.Random(seed + n)
+        client = Client(host, port)
+        for i in todo:
+            doctor, location, day = rng.choice(keys)
+            _, found = await call(client, "search", "POST", "/search", {"duration": 60, "date": day.isoformat(), "doctor": doctor, "location": location})
+            if not found["slots"]:
+                outcomes["no slots"] += 1
+                continue
+            slot = rng.choice(found["slots"][:3])
+            status, held = await call(client, "hold", "POST", "/holds", slot)
+            if status != 201:
+                outcomes[f"hold {held.get('status')}"] += 1
+                continue
+            intake = {"first_name": f"Load{n}", "last_name": f"Client{i}", "dob": "1980-01-01", "email": f"load{i}@example.com"}
+            status, booked = await call(client, "book", "POST", "/appointments", dict(slot, intake=intake, hold_id=held["hold_id"]))
+            outcomes["booked" if status == 201 else f"book {booked.get('status') or booked.get('error')}"] += 1
+        await client.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    return time.perf_counter() - t0, latencies, outcomes
+
+def double_bookings(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT doctor, location, slot_start, slot_end FROM appointments WHERE status != 'cancelled' ORDER BY doctor, location, slot_start").fetchall()
+    conn.close()
+    overlaps = 0
+    for prev, cur in zip(rows, rows[1:]):
+        if prev[:2] == cur[:2] and cur[2] < prev[3]:
+            overlaps += 1
+    return overlaps
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive search -> hold -> book through the HTTP API from many concurrent clients")
+    parser.add_argument("--scale", type=int, default=10000, help="synthetic dataset size (see synthetic.py)")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--bookings", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="server thread pool size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="load_api_"))
+    df_patients, df_sched, df_appts = synthetic.dataset(args.scale, args.seed)
+    synthetic.write_dataset(workdir / "data", {"patients": df_patients, "schedules": df_sched, "appointments": df_appts}, "sqlite")
+    keys = sorted(set(zip(df_sched["doctor"], df_sched["location"], df_sched["date"])))
+    port = free_port()
+    env = dict(os.environ, SCHEDULER_STORAGE="sqlite", SCHEDULER_DB=str(workdir / "data" / "scheduler.db"))
+    proc = subprocess.Popen([sys.executable, str(ROOT / "api.py"), "--port", str(port), "--workers", str(args.workers)], cwd=workdir, env=env, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_ready("127.0.0.1", port, proc))
+        elapsed, latencies, outcomes = asyncio.run(run_clients("127.0.0.1", port, keys, args.clients, args.bookings, args.seed))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    requests = sum(len(v) for v in latencies.values())
+    print(f"scale={args.scale} clients={args.clients} server_workers={args.workers} elapsed={elapsed:.2f}s")
+    print(f"{requests / elapsed:.0f} requests/s, {outcomes['booked'] / elapsed:.0f} bookings/s, outcomes={dict(outcomes)}")
+    for name, samples in latencies.items():
+        ms = np.array(samples) * 1000
+        print(f"{name:8s} n={len(ms):6d} p50={np.percentile(ms, 50):7.2f}ms p95={np.percentile(ms, 95):7.2f}ms p99={np.percentile(ms, 99):7.2f}ms")
+    overlaps = double_bookings(workdir / "data" / "scheduler.db")
+    print(f"overlapping appointments: {overlaps}")
+    if overlaps:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
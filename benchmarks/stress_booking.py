@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer book_slot from many threads and check for double bookings")
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "excel"])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=40)
+    parser.add_argument("--doctors", type=int, default=2)
+    parser.add_argument("--days", type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress_booking_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    os.environ["SCHEDULER_STORAGE"] = args.storage
+    os.environ["SCHEDULER_DB"] = os.path.join(workdir, "data", "scheduler.db")
+    from bench_slot_engine import synthetic_schedules
+    df = synthetic_schedules(args.doctors, args.days)
+    df["available"] = True
+    df.to_excel("data/doctor_schedules.xlsx", index=False, engine="openpyxl")
+
+    import data_layer
+    from scheduling import BOOKED, CONFLICT, book_slot, slot_index
+
+    schedules = data_layer.load_schedules()
+    keys = list(slot_index(schedules).keys())
+    start_barrier = threading.Barrier(args.threads)
+    outcomes = Counter()
+    booked = []
+    errors = []
+    guard = threading.Lock()
+
+    def worker(seed):
+        try:
+            attempt(seed)
+        except Exception as exc:
+            with guard:
+                errors.append(f"{type(exc).__name__}: {exc}")
+
+    def attempt(seed):
+        rng = random.Random(seed)
+        start_barrier.wait()
+        for _ in range(args.attempts):
+            doctor, location, day = rng.choice(keys)
+            start = datetime.combine(day, datetime.min.time()) + timedelta(hours=9, minutes=30 * rng.randrange(15))
+            end = start + timedelta(minutes=rng.choice([30, 60]))
+            frame = data_layer.load_schedules()
+            with data_layer.transaction():
+                status = book_slot(frame, doctor, location, day, start, end)
+                if status == BOOKED:
+                    data_layer.append_appointment({"appointment_id": str(uuid.uuid4()), "doctor": doctor, "location": location, "appointment_date": day, "slot_start": start, "slot_end": end, "status": "scheduled"})
+            with guard:
+                outcomes[status] += 1
+                if status == BOOKED:
+                    booked.append((doctor, location, day, start, end))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    by_day = {}
+    for doctor, location, day, start, end in booked:
+        by_day.setdefault((doctor, location, day), []).append((start, end))
+    overlaps = 0
+    for intervals in by_day.values():
+        intervals.sort()
+        overlaps += sum(1 for a, b in zip(intervals, intervals[1:]) if b[0] < a[1])
+
+    data_layer.cache.bump()
+    stored = data_layer.load_schedules()
+    appts = data_layer.load_appointments()
+    slots_booked = sum(int((end - start).total_seconds() // 1800) for *_, start, end in booked)
+    print(f"storage={args.storage} threads={args.threads} attempts={args.threads * args.attempts} elapsed={elapsed:.2f}s")
+    print(f"outcomes={dict(outcomes)} worker errors={len(errors)}")
+    for error in errors:
+        print(f"  {error}")
+    print(f"overlapping bookings={overlaps} appointments stored={len(appts)} slots marked={int((~stored['available']).sum())} expected={slots_booked}")
+    finished = sum(outcomes.values()) == args.threads * args.attempts and not errors
+    ok = finished and overlaps == 0 and len(appts) == len(booked) and int((~stored["available"]).sum()) == slots_booked and outcomes[CONFLICT] > 0
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import sys
+import time
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from storage import PATIENT_COLS, SCHEDULE_COLS, APPT_COLS, TABLE_COLS
+
+FIRST_NAMES = ["Aarav","Aditi","Ajay","Anita","Arjun","Ashok","Deepa","Divya","Gaurav","Isha","Karan","Kavya","Kunal","Latha","Manoj","Meera","Neha","Nisha","Nolan","Pooja","Priya","Rahul","Rakesh","Rhea","Ritu","Rohit","Sanjay","Sneha","Sunita","Suresh","Tina","Varun","Vikram","Yash"]
+LAST_NAMES = ["Agarwal","Bose","Chatterjee","Chaudhary","Das","Dutta","Gupta","Iyer","Jain","Joseph","Kapoor","Khan","Kumar","Menon","Mishra","Nair","Patel","Pillai","Prasad","Rao","Reddy","Saxena","Shah","Sharma","Singh","Varma","Verma"]
+CITIES = ["Bengaluru","Chennai","Delhi","Hyderabad","Kolkata","Mumbai","Pune"]
+STATES = ["DL","KA","MH","TG","TN","WB"]
+CARRIERS = ["Aetna","BlueCross","Cigna","Kaiser","United"]
+LOCATIONS = ["Main Clinic","North Wing"]
+START_DAY = date(2025, 9, 1)
+SLOTS_PER_DAY = 16
+
+def _uuids(rng, n):
+    raw = rng.bytes(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+def patients(n, seed=11):
+    rng = np.random.default_rng(seed)
+    first = rng.choice(FIRST_NAMES, n)
+    last = rng.choice(LAST_NAMES, n)
+    dob = pd.Timestamp("1940-01-01") + pd.to_timedelta(rng.integers(0, 68 * 365, n), unit="D")
+    serial = np.arange(n).astype(str)
+    carrier = rng.choice(CARRIERS, n).astype(object)
+    carrier[rng.random(n) < 0.1] = None
+    return pd.DataFrame({
+        "patient_id": _uuids(rng, n),
+        "first_name": first,
+        "last_name": last,
+        "dob": dob.date,
+        "email": np.char.add(np.char.add(np.char.add(np.char.lower(first), "."), np.char.lower(last)), np.char.add(serial, "@example.com")),
+        "phone": np.char.add("9", rng.integers(0, 10**9, n).astype(str).astype("U9")),
+        "city": rng.choice(CITIES, n),
+        "state": rng.choice(STATES, n),
+        "zip": rng.integers(10000, 999999, n),
+        "insurance_carrier": carrier,
+        "member_id": np.char.add("MBR", rng.integers(10000, 99999, n).astype(str)),
+        "group_number": np.char.add("GRP", rng.integers(100, 999, n).astype(str)),
+        "is_returning": rng.random(n) < 0.7,
+    }, columns=PATIENT_COLS)
+
+def schedules(rows, months=3, start=START_DAY, locations=LOCATIONS):
+    # Weekday clinics of SLOTS_PER_DAY half-hour slots from 09:00; the number of doctors
+    # grows with `rows` so the calendar stays `months` long at every scale.
+    days = pd.bdate_range(start, periods=max(1, round(months * 21.7))).to_numpy(dtype="datetime64[D]")
+    doctor_days = -(-rows // SLOTS_PER_DAY)
+    doctors = -(-doctor_days // len(days))
+    cell = np.arange(doctor_days)
+    doc, day_pos = cell // len(days), cell % len(days)
+    slot = np.tile(np.arange(SLOTS_PER_DAY), doctor_days)[:rows]
+    doc = np.repeat(doc, SLOTS_PER_DAY)[:rows]
+    day_pos = np.repeat(day_pos, SLOTS_PER_DAY)[:rows]
+    day = days[day_pos]
+    starts = day.astype("datetime64[s]") + np.timedelta64(9, "h") + slot * np.timedelta64(30, "m")
+    names = np.array([f"Dr. {i:04d}" for i in range(doctors)])
+    return pd.DataFrame({
+        "doctor": names[doc],
+        "location": np.asarray(locations)[(doc + day_pos) % len(locations)],
+        "date": pd.to_datetime(day).date,
+        "slot_start": pd.to_datetime(starts),
+        "slot_end": pd.to_datetime(starts + np.timedelta64(30, "m")),
+        "available": np.ones(rows, dtype=bool),
+    }, columns=SCHEDULE_COLS)
+
+def appointments(n, df_patients, df_sched, now=None, seed=17):
+    # Books n random slots of df_sched (marking them unavailable in place) for random patients.
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or datetime(2025, 9, 1, 8, 0))
+    n = min(n, len(df_sched))
+    booked = rng.choice(len(df_sched), n, replace=False)
+    df_sched.iloc[booked, df_sched.columns.get_loc("available")] = False
+    slots = df_sched.iloc[booked]
+    people = df_patients.iloc[rng.integers(0, len(df_patients), n)] if len(df_patients) else df_patients.reindex(range(n))
+    starts = pd.to_datetime(slots["slot_start"]).reset_index(drop=True)
+    cancelled = rng.random(n) < 0.05
+    reminder = np.where(starts < now, "sent", "pending")
+    return pd.DataFrame({
+        "appointment_id": _uuids(rng, n),
+        "created_at": starts - pd.to_timedelta(rng.integers(24, 60 * 24, n), unit="h"),
+        "patient_id": people["patient_id"].to_numpy(),
+        "patient_name": (people["first_name"] + " " + people["last_name"]).to_numpy(),
+        "dob": pd.to_datetime(people["dob"]).to_numpy(),
+        "email": people["email"].to_numpy(),
+        "phone": people["phone"].to_numpy(),
+        "city": people["city"].to_numpy(),
+        "state": people["state"].to_numpy(),
+        "zip": people["zip"].to_numpy(),
+        "doctor": slots["doctor"].to_numpy(),
+        "location": slots["location"].to_numpy(),
+        "visit_type": np.where(people["is_returning"].to_numpy(dtype=bool), "returning", "new"),
+        "appointment_date": slots["date"].to_numpy(),
+        "slot_start": starts,
+        "slot_end": pd.to_datetime(slots["slot_end"]).to_numpy(),
+        "insurance_carrier": people["insurance_carrier"].to_numpy(),
+        "member_id": people["member_id"].to_numpy(),
+        "group_number": people["group_number"].to_numpy(),
+        "status": np.where(cancelled, "cancelled", "scheduled"),
+        "forms_sent": (starts < now).to_numpy(),
+        "reminder_1": reminder,
+        "reminder_2": reminder,
+        "reminder_3": reminder,
+        "cancellation_reason": np.where(cancelled, "Schedule conflict", ""),
+    }, columns=APPT_COLS)
+
+def dataset(scale, seed=0):
+    # `scale` patients and schedule rows, with a quarter of the slots booked.
+    df_patients = patients(scale, seed + 11)
+    df_sched = schedules(scale)
+    df_appts = appointments(scale // 4, df_patients, df_sched, seed=seed + 17)
+    return df_patients, df_sched, df_appts
+
+class FrameSource:
+    # Lets SqliteStorage seed straight from generated frames.
+    def __init__(self, frames):
+        self.frames = frames
+
+    def read(self, table):
+        if table not in self.frames:
+            return pd.DataFrame(columns=TABLE_COLS[table])
+        return self.frames[table].copy()
+
+def write_dataset(out_dir, frames, fmt="xlsx"):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    if fmt == "sqlite":
+        from storage import SqliteStorage
+        SqliteStorage(out / "scheduler.db", seed_from=FrameSource(frames))
+        return [out / "scheduler.db"]
+    paths = [out / "patients.csv", out / "doctor_schedules.xlsx", out / "appointments.xlsx"]
+    frames["patients"].to_csv(paths[0], index=False)
+    frames["schedules"].to_excel(paths[1], index=False, engine="openpyxl")
+    frames["appointments"].to_excel(paths[2], index=False, engine="openpyxl")
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic patients/schedules/appointments dataset")
+    parser.add_argument("--scale", type=int, default=10000, help="patients and schedule rows; a quarter of the slots get appointments")
+    parser.add_argument("--out", default="data_synthetic")
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "sqlite"], help="the repo's CSV/Excel layout or a ready scheduler.db")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    df_patients, df_sched, df_appts = dataset(args.scale, args.seed)
+    built = time.perf_counter() - t0
+    paths = write_dataset(args.out, {"patients": df_patients, "schedules": df_sched, "appointments": df_appts}, args.format)
+    print(f"patients={len(df_patients)} schedule_rows={len(df_sched)} doctors={df_sched['doctor'].nunique()} appointments={len(df_appts)}")
+    print(f"generated in {built:.2f}s, written in {time.perf_counter() - t0 - built:.2f}s: {', '.join(map(str, paths))}")
+
+if __name__ == "__main__":
+    main()
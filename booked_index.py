@@ -0,0 +1,146 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, time, timedelta
+import numpy as np
+import pandas as pd
+
+# Columns whose change moves or frees a booked interval.
+INTERVAL_COLUMNS = {"doctor", "location", "patient_id", "slot_start", "slot_end", "status"}
+
+def _active(status):
+    return str(status).strip().lower() != "cancelled"
+
+class IntervalIndex:
+    # Sorted (start, end, label) lists per key. An interval overlapping [start, end) must
+    # begin before `end` and no earlier than `start - longest`, so a query is two bisects
+    # plus the few candidates in between, even when the stored intervals overlap each other.
+    def __init__(self):
+        self._items = {}
+        self._longest = {}
+
+    def add(self, key, start, end, label):
+        insort(self._items.setdefault(key, []), (start, end, label))
+        if end - start > self._longest.get(key, timedelta(0)):
+            self._longest[key] = end - start
+
+    def extend_sorted(self, key, items, longest):
+        self._items[key] = items
+        self._longest[key] = longest
+
+    def remove(self, key, start, end, label):
+        items = self._items.get(key)
+        if items:
+            i = bisect_left(items, (start, end, label))
+            if i < len(items) and items[i] == (start, end, label):
+                del items[i]
+
+    def overlapping(self, key, start, end):
+        items = self._items.get(key)
+        if not items:
+            return []
+        lo = bisect_left(items, (start - self._longest[key],))
+        hi = bisect_left(items, (end,))
+        return [(s, e, label) for s, e, label in items[lo:hi] if start < e]
+
+    def overlaps(self):
+        # Every overlapping pair within a key: one sweep over the sorted intervals with a
+        # heap of the ones still open, O(n log n + pairs).
+        for key, items in self._items.items():
+            open_ends = []
+            for s, e, label in items:
+                while open_ends and open_ends[0][0] <= s:
+                    heapq.heappop(open_ends)
+                for _, other in open_ends:
+                    yield key, other, label
+                heapq.heappush(open_ends, (e, label))
+
+class BookedIntervals:
+    # Active appointments indexed by doctor and by patient. Serves the booked overlay for
+    # schedule days generated from templates, the overlap checks at booking time, and the
+    # double-booking audit over the whole history.
+    def __init__(self):
+        self.doctors = IntervalIndex()
+        self.patients = IntervalIndex()
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        booked = cls()
+        if df.empty:
+            return booked
+        starts = pd.to_datetime(df["slot_start"], errors="coerce")
+        ends = pd.to_datetime(df["slot_end"], errors="coerce")
+        keep = (starts.notna() & ends.notna() & (ends > starts) & (df["status"].astype(str).str.strip().str.lower() != "cancelled")).to_numpy()
+        labels = np.empty(keep.sum(), dtype=object)
+        labels[:] = df.index[keep].tolist()
+        doctors, locations, patients = (df[col].to_numpy()[keep] for col in ("doctor", "location", "patient_id"))
+        start_us = starts.to_numpy(dtype="datetime64[us]")[keep]
+        end_us = ends.to_numpy(dtype="datetime64[us]")[keep]
+        start_obj, end_obj = start_us.astype(object), end_us.astype(object)
+        booked._rows = dict(zip(labels, zip(doctors, locations, patients, start_obj, end_obj)))
+        # Bulk build: one sort per index instead of an insort per row.
+        rank = pd.factorize(labels, sort=True)[0]
+        length = end_us - start_us
+        for index, keys in ((booked.doctors, doctors), (booked.patients, patients)):
+            codes, uniques = pd.factorize(keys)
+            order = np.lexsort((rank, end_us, start_us, codes))
+            order = order[codes[order] >= 0]
+            if not len(order):
+                continue
+            bounds = np.flatnonzero(np.diff(codes[order])) + 1
+            firsts = np.r_[0, bounds]
+            for take, code, longest in zip(np.split(order, bounds), codes[order[firsts]], np.maximum.reduceat(length[order], firsts)):
+                index.extend_sorted(uniques[code], list(zip(start_obj[take], end_obj[take], labels[take])), longest.item())
+        return booked
+
+    def _set(self, label, doctor, location, patient, start, end, status):
+        old = self._rows.pop(label, None)
+        if old is not None:
+            self.doctors.remove(old[0], old[3], old[4], label)
+            self.patients.remove(old[2], old[3], old[4], label)
+        if pd.isna(start) or pd.isna(end) or not _active(status):
+            return
+        start, end = pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()
+        if end <= start:
+            return
+        self._rows[label] = (doctor, location, patient, start, end)
+        self.doctors.add(doctor, start, end, label)
+        if not pd.isna(patient):
+            self.patients.add(patient, start, end, label)
+
+    def get(self, doctor, location, day):
+        # (start, end) of the doctor's appointments at `location` on `day`.
+        begin = datetime.combine(day, time())
+        with self._lock:
+            return [(s, e) for s, e, label in self.doctors.overlapping(doctor, begin, begin + timedelta(days=1)) if self._rows[label][1] == location]
+
+    def conflicts(self, doctor, patient_id, start_dt, end_dt):
+        # Labels of active appointments the new one would collide with, per side.
+        with self._lock:
+            return {
+                "doctor": [label for _, _, label in self.doctors.overlapping(doctor, start_dt, end_dt)],
+                "patient": [label for _, _, label in self.patients.overlapping(patient_id, start_dt, end_dt)] if patient_id is not None else [],
+            }
+
+    def overlaps(self):
+        # (kind, doctor or patient_id, label, other label) for every overlapping pair.
+        with self._lock:
+            pairs = [("doctor", key, a, b) for key, a, b in self.doctors.overlaps()]
+            pairs += [("patient", key, a, b) for key, a, b in self.patients.overlaps()]
+        return pairs
+
+    def append_rows(self, rows):
+        with self._lock:
+            for label, row in rows:
+                self._set(label, row.get("doctor"), row.get("location"), row.get("patient_id"), row.get("slot_start"), row.get("slot_end"), row.get("status"))
+
+    def update_rows(self, df, labels, columns):
+        if not INTERVAL_COLUMNS & set(columns):
+            return
+        labels = list(labels)
+        rows = df.loc[labels, ["doctor", "location", "patient_id", "slot_start", "slot_end", "status"]]
+        with self._lock:
+            for label, values in zip(labels, rows.itertuples(index=False, name=None)):
+                self._set(label, *values)
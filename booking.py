@@ -0,0 +1,164 @@
+import uuid
+from datetime import datetime
+import pandas as pd
+from data_layer import transaction, load_patients, load_schedules, append_patient, append_appointment, find_appointment, update_appointments
+from diagnostics import diag
+from holds import HoldRegistry
+from scheduling import BOOKED, CONFLICT, UNAVAILABLE, FIRST_AVAILABLE_LIMIT, SlotConflict, booking_conflict, find_patient, similar_patients, visit_duration, slot_options, next_available, book_slot, release_slot, slot_index
+from slot_index import FREE
+
+# Transport-independent booking flow shared by the Streamlit wizard and the HTTP API.
+# `intake` dicts use the wizard's field names (insurance, group_no, ...).
+
+holds = HoldRegistry()
+STATUSES = ["scheduled", "confirmed", "completed", "no_show", "cancelled"]
+
+def record(row):
+    if row is None:
+        return None
+    return {k: (None if not isinstance(v, (list, dict)) and pd.isna(v) else v) for k, v in dict(row).items()}
+
+def lookup_patient(first, last, dob, limit=5):
+    patients = load_patients()
+    existing = find_patient(patients, first, last, dob)
+    similar = similar_patients(patients, first, last, dob, limit) if existing is None else patients.iloc[0:0]
+    return existing, similar
+
+def _doctor_free(slots):
+    # The slot index only knows its own location; drop starts where the doctor is already
+    # booked somewhere else.
+    return [s for s in slots if booking_conflict(s["doctor"], None, s["slot_start"], s["slot_end"]) is None]
+
+@diag.timed("booking.search_slots")
+def search_slots(duration_min, day=None, doctor=None, location=None, first_available=False, end_day=None, not_before=None, limit=FIRST_AVAILABLE_LIMIT, owner=None):
+    # Open slots minus ranges other sessions hold; the owner's own hold stays visible.
+    schedules = load_schedules()
+    if not first_available:
+        return _doctor_free(holds.filter(({"doctor": doctor, "location": location, "date": day, "slot_start": s, "slot_end": e} for s, e in slot_options(schedules, doctor, location, day, duration_min)), owner))
+    # Held and cross-location starts are dropped after the search, so widen it until `limit`
+    # usable ones are found.
+    fetch = limit
+    while True:
+        found = next_available(schedules, duration_min, day, end_day, doctor=doctor, location=location, limit=fetch, not_before=not_before)
+        free = _doctor_free(holds.filter(found, owner))
+        if len(free) >= limit or len(found) < fetch:
+            return free[:limit]
+        fetch *= 2
+
+@diag.timed("booking.hold_slot")
+def hold_slot(doctor, location, day, start_dt, end_dt, owner=None, ttl=None):
+    # Returns the hold, or CONFLICT / UNAVAILABLE when the range cannot be held.
+    day_slots = slot_index(load_schedules()).get(doctor, location, day)
+    state = day_slots.check(start_dt, end_dt) if day_slots is not None else UNAVAILABLE
+    if state != FREE:
+        return state
+    if booking_conflict(doctor, None, start_dt, end_dt) is not None:
+        return CONFLICT
+    return holds.place(doctor, location, day, start_dt, end_dt, owner, ttl) or CONFLICT
+
+def release_hold(hold_id):
+    return holds.release(hold_id)
+
+def new_patient_record(intake):
+    return {
+        "patient_id": str(uuid.uuid4()),
+        "first_name": intake["first_name"],
+        "last_name": intake["last_name"],
+        "dob": intake["dob"],
+        "email": intake["email"],
+        "phone": intake["phone"],
+        "city": intake["city"],
+        "state": intake["state"],
+        "zip": intake["zip"],
+        "insurance_carrier": intake["insurance"],
+        "member_id": intake["member_id"],
+        "group_number": intake["group_no"],
+        "is_returning": False
+    }
+
+def appointment_record(intake, patient, doctor, location, day, start_dt, end_dt, is_returning):
+    return {
+        "appointment_id": str(uuid.uuid4()),
+        "created_at": datetime.now(),
+        "patient_id": patient["patient_id"],
+        "patient_name": f'{patient["first_name"]} {patient["last_name"]}',
+        "dob": intake["dob"],
+        "email": intake["email"],
+        "phone": intake["phone"],
+        "city": intake["city"],
+        "state": intake["state"],
+        "zip": intake["zip"],
+        "doctor": doctor,
+        "location": location,
+        "visit_type": "returning" if is_returning else "new",
+        "appointment_date": day,
+        "slot_start": start_dt,
+        "slot_end": end_dt,
+        "insurance_carrier": intake["insurance"],
+        "member_id": intake["member_id"],
+        "group_number": intake["group_no"],
+        "status": "scheduled",
+        "forms_sent": False,
+        "reminder_1": "pending",
+        "reminder_2": "pending",
+        "reminder_3": "pending",
+        "cancellation_reason": ""
+    }
+
+@diag.timed("booking.create_appointment")
+def create_appointment(intake, doctor, location, day, start_dt, end_dt, existing=None, hold_id=None, owner=None):
+    # Books the slot range and writes the patient (if new) and appointment in one
+    # transaction. Raises SlotConflict(CONFLICT | UNAVAILABLE) when the slot is gone or
+    # held by someone else, and SlotConflict(OVERLAP) when the patient is already booked
+    # at that time. A lost race is raised after the transaction: book_slot has
+    # already undone its own changes, and raising inside would needlessly invalidate
+    # every cached table.
+    if holds.blocks(doctor, location, day, start_dt, end_dt, hold_id, owner):
+        raise SlotConflict(CONFLICT)
+    schedules = load_schedules()
+    with transaction():
+        status = booking_conflict(doctor, None if existing is None else existing["patient_id"], start_dt, end_dt)
+        if status is None:
+            status = book_slot(schedules, doctor, location, day, start_dt, end_dt)
+        if status == BOOKED:
+            patient = existing
+            if patient is None:
+                patient = new_patient_record(intake)
+                append_patient(patient)
+            appt = appointment_record(intake, patient, doctor, location, day, start_dt, end_dt, existing is not None)
+            append_appointment(appt)
+    if status != BOOKED:
+        raise SlotConflict(status)
+    if hold_id is not None:
+        holds.release(hold_id, "consumed")
+    return appt
+
+def book_for_intake(intake, doctor, location, day, start_dt, end_dt, hold_id=None):
+    # Headless version of step 7: returning patients are matched exactly, everyone else
+    # is booked as new with the matching visit duration checked against the range.
+    existing = find_patient(load_patients(), intake["first_name"], intake["last_name"], intake["dob"])
+    if end_dt - start_dt != pd.Timedelta(minutes=visit_duration(existing is not None)):
+        raise ValueError("slot length does not match the visit duration")
+    return create_appointment(intake, doctor, location, day, start_dt, end_dt, existing, hold_id)
+
+@diag.timed("booking.set_status")
+def set_status(appointment_id, status, reason=""):
+    # Records a status change and returns the updated appointment (None if unknown).
+    # Cancelling frees the slot; a cancelled appointment is final, rebook instead.
+    if status not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    row = find_appointment(appointment_id)
+    if row is None:
+        return None
+    current = str(row["status"]).strip().lower()
+    if current == status:
+        return record(row)
+    if current == "cancelled":
+        raise ValueError("appointment is already cancelled")
+    with transaction():
+        fields = {"status": status}
+        if status == "cancelled":
+            fields["cancellation_reason"] = reason
+            release_slot(load_schedules(), row["doctor"], row["location"], pd.Timestamp(row["appointment_date"]).date(), pd.Timestamp(row["slot_start"]).to_pydatetime(), pd.Timestamp(row["slot_end"]).to_pydatetime())
+        update_appointments({appointment_id: fields})
+    return record(find_appointment(appointment_id))
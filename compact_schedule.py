@@ -0,0 +1,103 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from storage import SCHEDULE_COLS
+
+NO_DAY = np.iinfo(np.int32).min
+NO_MIN = np.iinfo(np.int16).min
+
+class CompactSchedule:
+    # The schedule table as a few flat arrays: doctor/location codes into sorted name
+    # tables, the date as days since 1970-01-01, slot times as minutes from that date's
+    # midnight, and availability packed 8 slots to a byte. About 9 bytes a slot instead
+    # of several hundred for the parsed frame, and saved as an uncompressed .npz that
+    # loads without any parsing.
+    __slots__ = ("doctors", "locations", "doctor", "location", "day", "start_min", "end_min", "bits", "n")
+
+    def __init__(self, doctors, locations, doctor, location, day, start_min, end_min, bits, n):
+        self.doctors = doctors
+        self.locations = locations
+        self.doctor = doctor
+        self.location = location
+        self.day = day
+        self.start_min = start_min
+        self.end_min = end_min
+        self.bits = bits
+        self.n = int(n)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if name != "n")
+
+    @classmethod
+    def from_frame(cls, df):
+        # None when the frame carries columns or values the compact form cannot hold.
+        if sorted(df.columns) != sorted(SCHEDULE_COLS):
+            return None
+        doctor, doctors = pd.factorize(df["doctor"], sort=True)
+        location, locations = pd.factorize(df["location"], sort=True)
+        day = pd.to_datetime(df["date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+        base = day.astype("datetime64[m]")
+        offsets = []
+        for col in ("slot_start", "slot_end"):
+            exact = pd.to_datetime(df[col], errors="coerce").to_numpy(dtype="datetime64[s]")
+            times = exact.astype("datetime64[m]")
+            missing = np.isnat(times)
+            if (np.isnat(base) & ~missing).any() or (times[~missing] != exact[~missing]).any():
+                return None
+            minutes = (times - base).astype(np.int64)
+            if ((minutes[~missing] < 0) | (minutes[~missing] > np.iinfo(np.int16).max)).any():
+                return None
+            offsets.append(np.where(missing, NO_MIN, minutes).astype(np.int16))
+        return cls(
+            np.asarray(doctors, dtype=str), np.asarray(locations, dtype=str),
+            doctor.astype(np.int16), location.astype(np.int16),
+            np.where(np.isnat(day), NO_DAY, day.astype(np.int64)).astype(np.int32),
+            offsets[0], offsets[1],
+            np.packbits(df["available"].to_numpy(dtype=bool)), len(df),
+        )
+
+    def available(self):
+        return np.unpackbits(self.bits, count=self.n).astype(bool)
+
+    def to_frame(self):
+        # Categorical names, one shared date object per distinct day and second-resolution
+        # datetimes: the frame the rest of the app reads, at a fraction of the parsed size.
+        days, inverse = np.unique(self.day, return_inverse=True)
+        day_objects = np.array([None if d == NO_DAY else d.astype("datetime64[D]").item() for d in days], dtype=object)
+        base = np.where(self.day == NO_DAY, np.datetime64("NaT"), self.day.astype("datetime64[D]")).astype("datetime64[s]")
+        times = {}
+        for col, minutes in (("slot_start", self.start_min), ("slot_end", self.end_min)):
+            values = base + minutes.astype("timedelta64[m]")
+            values[minutes == NO_MIN] = np.datetime64("NaT")
+            times[col] = values
+        return pd.DataFrame({
+            "doctor": pd.Categorical.from_codes(self.doctor, categories=self.doctors),
+            "location": pd.Categorical.from_codes(self.location, categories=self.locations),
+            "date": day_objects[inverse],
+            "slot_start": times["slot_start"],
+            "slot_end": times["slot_end"],
+            "available": self.available(),
+        }, columns=SCHEDULE_COLS)
+
+    def save(self, path, stamp):
+        # Written next to the target and renamed over it, so readers never see half a file.
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as out:
+            np.savez(out, stamp=np.array(repr(stamp)), n=np.array(self.n), **{name: getattr(self, name) for name in self.__slots__ if name != "n"})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        # None when there is no snapshot or it was taken from a different version of the source.
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["stamp"]) != repr(stamp):
+                    return None
+                return cls(**{name: data[name] for name in cls.__slots__})
+        except (OSError, KeyError, ValueError):
+            return None
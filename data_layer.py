@@ -0,0 +1,249 @@
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+from compact_schedule import CompactSchedule
+from diagnostics import diag
+from storage import DATA_DIR, PATIENTS_CSV, SCHEDULE_XLSX, APPTS_XLSX, SCHEDULE_SNAPSHOT, PATIENT_COLS, SCHEDULE_COLS, APPT_COLS, open_storage, to_excel_bytes
+
+class FrameCache:
+    # Process-wide: Streamlit re-executes app.py on every rerun but keeps imported modules,
+    # so frames parsed here survive across reruns and sessions.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sources = {}
+        self._entries = {}
+        self._versions = {}
+        self._derived = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+        self.last_load_seconds = {}
+
+    def register(self, name, stamp, reader):
+        with self._lock:
+            self._sources[name] = (stamp, reader)
+            self._versions.setdefault(name, 0)
+
+    def get(self, name):
+        stamp, reader = self._sources[name]
+        with self._lock:
+            key = (stamp(), self._versions[name])
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            t0 = time.perf_counter()
+            with diag.span(f"load.{name}"):
+                df = reader()
+            elapsed = time.perf_counter() - t0
+            diag.count("rows_loaded", len(df), name)
+            self.load_seconds += elapsed
+            self.last_load_seconds[name] = elapsed
+            self._entries[name] = (key, df)
+            self._derived.pop(name, None)
+            return df
+
+    def put(self, name, df):
+        stamp, _ = self._sources[name]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[1] is not df:
+                self._derived.pop(name, None)
+            self._entries[name] = ((stamp(), self._versions[name]), df)
+
+    def put_appended(self, name, df, rows):
+        # df is the cached frame plus `rows` ((label, record) pairs). Derived structures
+        # that can absorb appended rows are updated in place instead of being rebuilt.
+        stamp, _ = self._sources[name]
+        with self._lock:
+            kept = {}
+            for key, value in self._derived.get(name, {}).items():
+                if hasattr(value, "append_rows"):
+                    value.append_rows(rows)
+                    kept[key] = value
+            self._derived[name] = kept
+            self._entries[name] = ((stamp(), self._versions[name]), df)
+
+    def put_updated(self, name, df, labels, columns):
+        # The cached frame was changed in place; structures that care (`update_rows`) refresh
+        # the given rows, the rest are assumed not to depend on those columns.
+        stamp, _ = self._sources[name]
+        with self._lock:
+            for value in self._derived.get(name, {}).values():
+                if hasattr(value, "update_rows"):
+                    value.update_rows(df, labels, columns)
+            self._entries[name] = ((stamp(), self._versions[name]), df)
+
+    def derived(self, name, key, builder, df):
+        # Structures built from a cached frame (indexes etc.) live as long as that frame object;
+        # writers that mutate the frame in place keep them in sync themselves.
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[1] is not df:
+                return builder(df)
+            built = self._derived.setdefault(name, {})
+            if key not in built:
+                built[key] = builder(df)
+            return built[key]
+
+    def bump(self, name=None):
+        with self._lock:
+            for key in ([name] if name else list(self._sources)):
+                self._versions[key] += 1
+                self._derived.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "load_seconds": round(self.load_seconds, 4),
+                "last_load_seconds": {k: round(v, 4) for k, v in self.last_load_seconds.items()},
+                "versions": dict(self._versions),
+            }
+
+class RowLookup(dict):
+    # Key column value -> row label of the cached frame, extended as rows are appended.
+    def __init__(self, column, pairs=()):
+        super().__init__(pairs)
+        self.column = column
+
+    @classmethod
+    def builder(cls, column):
+        return lambda df: cls(column, zip(df[column], df.index))
+
+    def append_rows(self, rows):
+        for label, row in rows:
+            self[row.get(self.column)] = label
+
+store = open_storage()
+cache = FrameCache()
+
+def _read_schedules():
+    # Parsing the workbook (or table) dominates a cold start, so the compact form of the last
+    # parse is kept on disk and reused for as long as the source stamp is unchanged.
+    stamp = store.stamp("schedules")
+    compact = CompactSchedule.load(SCHEDULE_SNAPSHOT, stamp)
+    if compact is None:
+        df = store.read("schedules")
+        compact = CompactSchedule.from_frame(df)
+        if compact is None:
+            return df
+        try:
+            compact.save(SCHEDULE_SNAPSHOT, stamp)
+            diag.count("files_written", 1, "schedules.npz")
+        except OSError:
+            pass
+    return compact.to_frame()
+
+_readers = {"schedules": _read_schedules}
+for _table in ("patients", "schedules", "appointments", "schedule_rules"):
+    cache.register(_table, lambda t=_table: store.stamp(t), _readers.get(_table, lambda t=_table: store.read(t)))
+
+@contextmanager
+def transaction():
+    try:
+        with store.transaction():
+            yield
+    except BaseException:
+        cache.bump()
+        raise
+
+def load_patients():
+    return cache.get("patients")
+
+def load_schedules():
+    return cache.get("schedules")
+
+def load_appointments():
+    return cache.get("appointments")
+
+def load_schedule_rules():
+    return cache.get("schedule_rules")
+
+def save_patients(df):
+    store.write("patients", df)
+    cache.put("patients", df)
+
+def save_schedules(df):
+    store.write("schedules", df)
+    cache.put("schedules", df)
+
+def save_appointments(df):
+    store.write("appointments", df)
+    cache.put("appointments", df)
+
+def _append(name, *rows):
+    df = pd.concat([cache.get(name), pd.DataFrame(list(rows))], ignore_index=True)
+    store.append(name, df, rows)
+    cache.put_appended(name, df, list(zip(df.index[-len(rows):], rows)))
+    return df
+
+def append_patient(row):
+    return _append("patients", row)
+
+def append_appointment(row):
+    return _append("appointments", row)
+
+def append_schedule_rule(row):
+    return _append("schedule_rules", row)
+
+def append_schedule_rules(rows):
+    return _append("schedule_rules", *rows)
+
+def reserve_slots(df_sched, doctor, location, day, start_dt, end_dt):
+    if not store.reserve(df_sched, doctor, location, day, start_dt, end_dt):
+        cache.bump("schedules")
+        return False
+    cache.put("schedules", df_sched)
+    return True
+
+def reserve_many(df_sched, ranges):
+    if not store.reserve_many(df_sched, ranges):
+        cache.bump("schedules")
+        return False
+    cache.put("schedules", df_sched)
+    return True
+
+def set_slots_available(df_sched, ranges, available):
+    store.set_available(df_sched, ranges, available)
+    cache.put("schedules", df_sched)
+
+def export_excel(name):
+    return to_excel_bytes(cache.get(name))
+
+def _appointment_lookup(df):
+    return cache.derived("appointments", "by_id", RowLookup.builder("appointment_id"), df)
+
+def find_appointment(appointment_id):
+    df = load_appointments()
+    label = _appointment_lookup(df).get(appointment_id)
+    return None if label is None else df.loc[label]
+
+def update_appointments(updates):
+    # updates: {appointment_id: {column: value}}, applied to the cached frame in place
+    # and persisted as one batched write.
+    if not updates:
+        return
+    with transaction():
+        df = load_appointments()
+        lookup = _appointment_lookup(df)
+        columns = {}
+        for key, fields in updates.items():
+            label = lookup.get(key)
+            if label is None:
+                continue
+            for col, value in fields.items():
+                labels, values = columns.setdefault(col, ([], []))
+                labels.append(label)
+                values.append(value)
+        touched = set()
+        for col, (labels, values) in columns.items():
+            df.loc[labels, col] = values
+            touched.update(labels)
+        store.update("appointments", df, "appointment_id", updates)
+        cache.put_updated("appointments", df, list(touched), list(columns))
@@ -0,0 +1,194 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Where exports go unless a path is given; SCHEDULER_METRICS_JSONL also turns on a JSON line
+# per Streamlit rerun.
+METRICS_JSONL = os.environ.get("SCHEDULER_METRICS_JSONL", "")
+METRICS_PROM = os.environ.get("SCHEDULER_METRICS_PROM", os.path.join("data", "metrics.prom"))
+SAMPLES = 1024
+PROFILE_LINES = 30
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def _prom_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+class Diagnostics:
+    # Process-wide timing spans and counters, plus a per-thread record of the Streamlit rerun
+    # in progress (every session reruns on its own script thread). A span costs two
+    # perf_counter calls and a lock, so they stay on; cProfile runs only for a rerun that
+    # asks for it.
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.spans = {}
+        self.samples = {}
+        self.counters = {}
+        self.reruns = deque(maxlen=50)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _record(self, name, seconds):
+        with self._lock:
+            stat = self.spans.get(name)
+            if stat is None:
+                stat = self.spans[name] = [0, 0.0, 0.0]
+                self.samples[name] = deque(maxlen=SAMPLES)
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            self.samples[name].append(seconds)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        run = getattr(self._local, "run", None)
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self._local.depth = depth
+            self._record(name, seconds)
+            if run is not None:
+                run["spans"].append((t0 - run["t0"], depth, name, seconds))
+
+    def timed(self, name):
+        def wrap(fn):
+            @wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def count(self, name, n=1, source=""):
+        # e.g. count("rows_scanned", len(df), "appointments"); exported as
+        # scheduler_rows_scanned_total{source="appointments"}.
+        if not self.enabled:
+            return
+        key = (name, source)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+        run = getattr(self._local, "run", None)
+        if run is not None:
+            run["counters"][key] = run["counters"].get(key, 0) + n
+
+    def begin_rerun(self, label="", profile=False):
+        # A rerun cut short (st.rerun, st.stop) never reaches end_rerun; its profiler is
+        # stopped here so the thread is not left profiling.
+        old = getattr(self._local, "run", None)
+        if old is not None and old["profiler"] is not None:
+            old["profiler"].disable()
+        run = {"label": label, "started": time.time(), "t0": time.perf_counter(), "spans": [], "counters": {}, "profiler": None}
+        if profile and self.enabled:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                run["profiler"] = profiler
+            except ValueError:
+                # Python 3.12+ allows one profiler per process; another session has it.
+                pass
+        self._local.run = run
+        self._local.depth = 0
+        return run
+
+    def end_rerun(self, run=None):
+        # Returns the finished rerun as a plain dict (what the panel and the exports show).
+        run = run or getattr(self._local, "run", None)
+        if run is None:
+            return None
+        seconds = time.perf_counter() - run["t0"]
+        profile = None
+        if run["profiler"] is not None:
+            run["profiler"].disable()
+            out = io.StringIO()
+            pstats.Stats(run["profiler"], stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            profile = out.getvalue()
+        if getattr(self._local, "run", None) is run:
+            self._local.run = None
+        self._record("rerun", seconds)
+        done = {
+            "label": run["label"], "started": run["started"], "seconds": round(seconds, 6),
+            "spans": [{"at_ms": round(at * 1000, 3), "depth": depth, "name": name, "ms": round(s * 1000, 3)} for at, depth, name, s in sorted(run["spans"])],
+            "counters": {f"{name}:{source}" if source else name: n for (name, source), n in run["counters"].items()},
+            "profile": profile,
+        }
+        self.reruns.append(done)
+        if METRICS_JSONL:
+            self.write_jsonl(METRICS_JSONL, {"type": "rerun", **{k: v for k, v in done.items() if k != "profile"}})
+        return done
+
+    def snapshot(self):
+        with self._lock:
+            spans = {name: (list(stat), list(self.samples[name])) for name, stat in self.spans.items()}
+            counters = dict(self.counters)
+        return {
+            "spans": {
+                name: {"count": count, "total_s": round(total, 6), "mean_ms": round(total / count * 1000, 3), "p50_ms": round(_quantile(samples, 0.5) * 1000, 3), "p95_ms": round(_quantile(samples, 0.95) * 1000, 3), "max_ms": round(top * 1000, 3)}
+                for name, ((count, total, top), samples) in sorted(spans.items())
+            },
+            "counters": {f"{name}:{source}" if source else name: n for (name, source), n in sorted(counters.items())},
+        }
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.samples.clear()
+            self.counters.clear()
+            self.reruns.clear()
+
+    def write_jsonl(self, path=None, entry=None):
+        # Appends one JSON object per line; by default a timestamped snapshot.
+        entry = entry or {"type": "snapshot", "time": time.time(), **self.snapshot()}
+        with open(path or METRICS_JSONL or os.path.join("data", "metrics.jsonl"), "a") as out:
+            out.write(json.dumps(entry, default=str) + "\n")
+
+    def prometheus(self):
+        # Text exposition format: a summary per span and a counter per (name, source).
+        snap = self.snapshot()
+        lines = ["# HELP scheduler_span_seconds Time spent in instrumented code.", "# TYPE scheduler_span_seconds summary"]
+        for name, s in snap["spans"].items():
+            label = _prom_label(name)
+            lines.append(f'scheduler_span_seconds{{span="{label}",quantile="0.5"}} {s["p50_ms"] / 1000:.6f}')
+            lines.append(f'scheduler_span_seconds{{span="{label}",quantile="0.95"}} {s["p95_ms"] / 1000:.6f}')
+            lines.append(f'scheduler_span_seconds_sum{{span="{label}"}} {s["total_s"]:.6f}')
+            lines.append(f'scheduler_span_seconds_count{{span="{label}"}} {s["count"]}')
+        with self._lock:
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, source), n in counters:
+            metric = f"scheduler_{_prom_name(name)}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f'{metric}{{source="{_prom_label(source)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        # For a node_exporter textfile collector: written next to the target and renamed over it.
+        path = path or METRICS_PROM
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as out:
+            out.write(self.prometheus())
+        os.replace(tmp, path)
+        return path
+
+diag = Diagnostics(enabled=os.environ.get("SCHEDULER_DIAGNOSTICS", "1") != "0")
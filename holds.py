@@ -0,0 +1,113 @@
+import heapq
+import threading
+import time
+import uuid
+from collections import Counter
+
+HOLD_TTL_SEC = 120
+# Longest hold a caller may ask for; longer requests are cut to this.
+MAX_HOLD_TTL_SEC = 900
+
+class HoldRegistry:
+    # Short-lived claims on a slot range, kept per (doctor, location, date) so the
+    # availability filters only look at the few holds of the day being shown. Expiry is a
+    # min-heap of (expires, hold_id): every call first pops whatever has run out, so
+    # expired holds cost O(log n) once instead of a scan on every lookup. Released holds
+    # stay in the heap and are skipped when they surface.
+    def __init__(self, ttl=HOLD_TTL_SEC, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._days = {}
+        self._by_id = {}
+        self._owners = {}
+        self._expiry = []
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, hold_id = heapq.heappop(self._expiry)
+            hold = self._by_id.get(hold_id)
+            if hold is None or hold["expires"] != expires:
+                continue
+            self._drop(hold)
+            self.counts["expired"] += 1
+
+    def _drop(self, hold):
+        del self._by_id[hold["hold_id"]]
+        if self._owners.get(hold["owner"]) == hold["hold_id"]:
+            del self._owners[hold["owner"]]
+        key = (hold["doctor"], hold["location"], hold["date"])
+        day = self._days[key]
+        del day[hold["hold_id"]]
+        if not day:
+            del self._days[key]
+
+    def _blocking(self, key, start_dt, end_dt, hold_id=None, owner=None):
+        for h, hold in self._days.get(key, {}).items():
+            if h == hold_id or (owner is not None and hold["owner"] == owner):
+                continue
+            if hold["slot_start"] < end_dt and start_dt < hold["slot_end"]:
+                return hold
+        return None
+
+    def place(self, doctor, location, day, start_dt, end_dt, owner=None, ttl=None):
+        # A new hold replaces the owner's previous one: a session holds one slot at a time.
+        now = self.clock()
+        key = (doctor, location, day)
+        with self._lock:
+            self._expire(now)
+            if self._blocking(key, start_dt, end_dt, owner=owner) is not None:
+                self.counts["rejected"] += 1
+                return None
+            if owner in self._owners:
+                self._drop(self._by_id[self._owners[owner]])
+                self.counts["released"] += 1
+            hold = {"hold_id": str(uuid.uuid4()), "doctor": doctor, "location": location, "date": day, "slot_start": start_dt, "slot_end": end_dt, "owner": owner, "expires": now + min(ttl or self.ttl, MAX_HOLD_TTL_SEC)}
+            self._days.setdefault(key, {})[hold["hold_id"]] = hold
+            self._by_id[hold["hold_id"]] = hold
+            if owner is not None:
+                self._owners[owner] = hold["hold_id"]
+            heapq.heappush(self._expiry, (hold["expires"], hold["hold_id"]))
+            self.counts["placed"] += 1
+            return hold
+
+    def get(self, hold_id):
+        with self._lock:
+            self._expire(self.clock())
+            return self._by_id.get(hold_id)
+
+    def held_by(self, owner):
+        with self._lock:
+            self._expire(self.clock())
+            hold_id = self._owners.get(owner)
+            return self._by_id[hold_id] if hold_id is not None else None
+
+    def release(self, hold_id, outcome="released"):
+        # outcome is "released" (given up) or "consumed" (turned into a booking).
+        with self._lock:
+            hold = self._by_id.get(hold_id)
+            if hold is None:
+                return False
+            self._drop(hold)
+            self.counts[outcome] += 1
+            return True
+
+    def blocks(self, doctor, location, day, start_dt, end_dt, hold_id=None, owner=None):
+        # True when someone else's live hold overlaps the range; the caller's own holds do not count.
+        with self._lock:
+            self._expire(self.clock())
+            return self._blocking((doctor, location, day), start_dt, end_dt, hold_id, owner) is not None
+
+    def filter(self, slots, owner=None):
+        # Drops slot dicts that overlap someone else's hold, under one lock and one expiry pass.
+        with self._lock:
+            self._expire(self.clock())
+            if not self._days:
+                return list(slots)
+            return [slot for slot in slots if self._blocking((slot["doctor"], slot["location"], slot["date"]), slot["slot_start"], slot["slot_end"], owner=owner) is None]
+
+    def stats(self):
+        with self._lock:
+            self._expire(self.clock())
+            return dict({"active": len(self._by_id), "placed": 0, "consumed": 0, "released": 0, "expired": 0, "rejected": 0}, **self.counts)
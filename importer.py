@@ -0,0 +1,144 @@
+import os
+import uuid
+import pandas as pd
+from openpyxl import load_workbook
+from data_layer import cache, store, load_patients
+from diagnostics import diag
+from patient_index import normalize_name, normalize_dob
+from schedule_rules import clean_rules
+from scheduling import patient_index
+from storage import PATIENT_COLS, SCHEDULE_COLS, UPSERT_KEYS, as_bool, coerce_schedules
+
+CHUNK_ROWS = 5000
+
+def _size(fileobj):
+    try:
+        pos = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(pos)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+def iter_csv_chunks(fileobj, chunksize=CHUNK_ROWS):
+    total = _size(fileobj)
+    for chunk in pd.read_csv(fileobj, chunksize=chunksize):
+        yield chunk, (min(1.0, fileobj.tell() / total) if total else None)
+
+def iter_xlsx_chunks(fileobj, chunksize=CHUNK_ROWS):
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook.
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        total = ws.max_row
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        width = len(header)
+        buf = []
+        seen = 1
+        for row in rows:
+            seen += 1
+            if all(v is None for v in row):
+                continue
+            buf.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(buf) >= chunksize:
+                yield pd.DataFrame(buf, columns=header), (min(1.0, seen / total) if total else None)
+                buf = []
+        if buf:
+            yield pd.DataFrame(buf, columns=header), 1.0
+    finally:
+        wb.close()
+
+def _col(df, col):
+    return df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+def _text(df, col):
+    if col not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    return df[col].astype("string").str.strip()
+
+def clean_patients(chunk, resolve_id):
+    chunk.columns = [str(c).strip() for c in chunk.columns]
+    first = _text(chunk, "first_name")
+    last = _text(chunk, "last_name")
+    ok = first.fillna("").ne("") & last.fillna("").ne("")
+    raw_dob = _col(chunk, "dob")
+    dob = pd.to_datetime(raw_dob, errors="coerce")
+    ok &= dob.notna() | raw_dob.isna()
+    df = chunk.loc[ok].reindex(columns=PATIENT_COLS)
+    df["first_name"] = first[ok]
+    df["last_name"] = last[ok]
+    df["dob"] = dob[ok].dt.date
+    ids = df["patient_id"].astype("string").str.strip()
+    missing = ids.isna() | ids.eq("")
+    if missing.any():
+        ids = ids.astype(object)
+        for label in ids.index[missing]:
+            ids[label] = resolve_id(df.at[label, "first_name"], df.at[label, "last_name"], df.at[label, "dob"])
+    df["patient_id"] = ids.astype(str)
+    df["is_returning"] = as_bool(df["is_returning"])
+    df = df.drop_duplicates(subset=UPSERT_KEYS["patients"], keep="last")
+    return df, int((~ok).sum())
+
+def clean_schedules(chunk):
+    chunk.columns = [str(c).strip() for c in chunk.columns]
+    starts = pd.to_datetime(_col(chunk, "slot_start"), errors="coerce")
+    ends = pd.to_datetime(_col(chunk, "slot_end"), errors="coerce")
+    ok = _text(chunk, "doctor").fillna("").ne("") & _text(chunk, "location").fillna("").ne("")
+    ok &= starts.notna() & ends.notna() & (ends > starts)
+    df = chunk.loc[ok].reindex(columns=SCHEDULE_COLS)
+    df["doctor"] = _text(chunk, "doctor")[ok]
+    df["location"] = _text(chunk, "location")[ok]
+    df["slot_start"] = starts[ok]
+    df["slot_end"] = ends[ok]
+    days = pd.to_datetime(df["date"], errors="coerce")
+    df["date"] = days.where(days.notna(), starts[ok].dt.normalize())
+    df["available"] = df["available"].where(df["available"].notna(), True)
+    df = coerce_schedules(df).drop_duplicates(subset=UPSERT_KEYS["schedules"], keep="last")
+    return df, int((~ok).sum())
+
+def _patient_resolver():
+    # Rows without a patient_id are matched to existing patients (or earlier rows of the
+    # same upload) by normalised name and dob before a new id is minted.
+    existing = load_patients()
+    index = patient_index(existing)
+    seen = {}
+
+    def resolve(first, last, dob):
+        key = (normalize_name(first), normalize_name(last), normalize_dob(dob))
+        if key not in seen:
+            label = index.lookup(first, last, dob)
+            seen[key] = str(existing.at[label, "patient_id"]) if label is not None else str(uuid.uuid4())
+        return seen[key]
+    return resolve
+
+@diag.timed("importer.import_file")
+def import_file(table, fileobj, filename, chunksize=CHUNK_ROWS, progress=None):
+    if table == "patients":
+        resolve = _patient_resolver()
+        clean = lambda chunk: clean_patients(chunk, resolve)
+    elif table == "schedules":
+        clean = clean_schedules
+    elif table == "schedule_rules":
+        clean = clean_rules
+    else:
+        raise ValueError(f"cannot import into {table}")
+    chunks = iter_xlsx_chunks if str(filename).lower().endswith((".xlsx", ".xlsm")) else iter_csv_chunks
+    summary = {"chunks": 0, "rows": 0, "imported": 0, "rejected": 0}
+    try:
+        for chunk, fraction in chunks(fileobj, chunksize):
+            rows = len(chunk)
+            df, rejected = clean(chunk)
+            if not df.empty:
+                store.upsert(table, df)
+            summary["chunks"] += 1
+            summary["rows"] += rows
+            summary["imported"] += len(df)
+            summary["rejected"] += rejected
+            if progress is not None:
+                progress(fraction, dict(summary))
+        store.flush()
+    finally:
+        cache.bump(table)
+    return summary
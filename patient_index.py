@@ -0,0 +1,104 @@
+import threading
+from difflib import SequenceMatcher
+from datetime import date, datetime
+import pandas as pd
+from diagnostics import diag
+
+_SOUNDEX_CODES = {c: d for d, letters in {"1": "bfpv", "2": "cgjkqsxz", "3": "dt", "4": "l", "5": "mn", "6": "r"}.items() for c in letters}
+
+def normalize_name(value):
+    return str(value).strip().lower()
+
+def normalize_dob(value):
+    if value is None or (not isinstance(value, (date, str)) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    parsed = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(parsed) else parsed.date()
+
+def soundex(name):
+    letters = [c for c in name.lower() if c.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    prev = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != prev:
+            code += digit
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            prev = digit
+    return code.ljust(4, "0")
+
+class PatientIndex:
+    # (first, last, dob) -> row labels in frame order, so the first label matches what a
+    # full-frame mask would have returned. Phonetic buckets are built on first fuzzy lookup.
+    def __init__(self):
+        self.exact = {}
+        self.keys = {}
+        self.by_dob = {}
+        self.by_sound = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        index = cls()
+        if df.empty:
+            return index
+        firsts = df["first_name"].astype(str).str.strip().str.lower()
+        lasts = df["last_name"].astype(str).str.strip().str.lower()
+        dobs = pd.to_datetime(df["dob"], errors="coerce").dt.date
+        for label, f, l, d in zip(df.index, firsts, lasts, dobs):
+            index._add(label, f, l, None if pd.isna(d) else d)
+        return index
+
+    def _add(self, label, first, last, dob):
+        self.keys[label] = (first, last, dob)
+        self.exact.setdefault((first, last, dob), []).append(label)
+        self.by_dob.setdefault(dob, []).append(label)
+        if self.by_sound is not None:
+            self.by_sound.setdefault((soundex(first), soundex(last)), []).append(label)
+
+    def append_rows(self, rows):
+        with self._lock:
+            for label, row in rows:
+                self._add(label, normalize_name(row.get("first_name", "")), normalize_name(row.get("last_name", "")), normalize_dob(row.get("dob")))
+
+    def lookup(self, first, last, dob):
+        dob = normalize_dob(dob)
+        if dob is None:
+            return None
+        labels = self.exact.get((normalize_name(first), normalize_name(last), dob))
+        return labels[0] if labels else None
+
+    def similar(self, first, last, dob, limit=5, min_score=0.8):
+        with self._lock:
+            if self.by_sound is None:
+                by_sound = {}
+                for label, (f, l, _) in self.keys.items():
+                    by_sound.setdefault((soundex(f), soundex(l)), []).append(label)
+                self.by_sound = by_sound
+        f, l, d = normalize_name(first), normalize_name(last), normalize_dob(dob)
+        sounds = set(self.by_sound.get((soundex(f), soundex(l)), ()))
+        labels = set(self.by_dob.get(d, ())) if d is not None else set()
+        labels.update(sounds)
+        diag.count("rows_scanned", len(labels), "patients")
+        scored = []
+        for label in labels:
+            rf, rl, rd = self.keys[label]
+            if (rf, rl, rd) == (f, l, d):
+                continue
+            score = (SequenceMatcher(None, f, rf).ratio() + SequenceMatcher(None, l, rl).ratio()) / 2
+            if label in sounds:
+                score = min(1.0, score + 0.15)
+            if rd != d:
+                score *= 0.9
+            if score >= min_score:
+                scored.append((score, label))
+        scored.sort(key=lambda item: -item[0])
+        return [label for _, label in scored[:limit]]
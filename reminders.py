@@ -0,0 +1,290 @@
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from data_layer import DATA_DIR, cache, load_appointments, update_appointments
+from diagnostics import diag
+from storage import as_bool
+
+OUTBOX_DIR = DATA_DIR / "outbox"
+
+# forms go out as soon as the appointment exists; reminders count back from slot_start.
+KINDS = ["forms_sent", "reminder_1", "reminder_2", "reminder_3"]
+OFFSETS = {"reminder_1": timedelta(days=3), "reminder_2": timedelta(days=1), "reminder_3": timedelta(hours=2)}
+# A reminder that is only picked up once the next one is already due is skipped rather than sent late.
+SUPERSEDED_AT = {"forms_sent": timedelta(0), "reminder_1": OFFSETS["reminder_2"], "reminder_2": OFFSETS["reminder_3"], "reminder_3": timedelta(0)}
+# forms_sent is a flag with no room for a failure, so a failed send is queued again after a
+# delay that doubles with each failure.
+FORMS_RETRY = timedelta(minutes=5)
+FORMS_RETRY_MAX = timedelta(hours=6)
+
+# Updates to these columns move or cancel reminders.
+TIMING_COLUMNS = {"slot_start", "created_at", "status"}
+
+SENT = "sent"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+class SendError(Exception):
+    pass
+
+def _due_times(kind, start, created):
+    if kind == "forms_sent":
+        return created.fillna(start)
+    return start - OFFSETS[kind]
+
+def _is_pending(kind, values):
+    if kind == "forms_sent":
+        return ~as_bool(values)
+    return values.astype(str).str.strip().str.lower() == "pending"
+
+class ReminderQueue:
+    # Pending (due time, row, kind) entries sorted by due time. Entries before `cursor`
+    # have been handed out; rows appended after the build go to a small heap.
+    def __init__(self, due, labels, kinds):
+        order = np.argsort(due, kind="stable")
+        self.due = due[order]
+        self.labels = labels[order]
+        self.kinds = kinds[order]
+        self.cursor = 0
+        self.late = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        dues, labels, kinds = [np.empty(0, dtype="datetime64[s]")], [np.empty(0, dtype=df.index.dtype)], [np.empty(0, dtype=np.int64)]
+        if not df.empty:
+            active = df["status"].astype(str).str.strip().str.lower() != "cancelled"
+            start = pd.to_datetime(df["slot_start"], errors="coerce")
+            created = pd.to_datetime(df["created_at"], errors="coerce")
+            for code, kind in enumerate(KINDS):
+                when = _due_times(kind, start, created)
+                mask = (_is_pending(kind, df[kind]) & active & when.notna()).to_numpy()
+                dues.append(when.to_numpy(dtype="datetime64[s]")[mask])
+                labels.append(df.index.to_numpy()[mask])
+                kinds.append(np.full(int(mask.sum()), code, dtype=np.int64))
+        return cls(np.concatenate(dues), np.concatenate(labels), np.concatenate(kinds))
+
+    def append_rows(self, rows):
+        with self._lock:
+            for label, row in rows:
+                if str(row.get("status", "")).strip().lower() == "cancelled":
+                    continue
+                start = pd.Series([pd.to_datetime(row.get("slot_start"), errors="coerce")])
+                created = pd.Series([pd.to_datetime(row.get("created_at"), errors="coerce")])
+                for code, kind in enumerate(KINDS):
+                    when = _due_times(kind, start, created).iloc[0]
+                    if pd.notna(when) and _is_pending(kind, pd.Series([row.get(kind)], dtype=object)).iloc[0]:
+                        heapq.heappush(self.late, (np.datetime64(when, "s"), label, code))
+
+    def update_rows(self, df, labels, columns):
+        # Changed rows get fresh entries; their old ones are re-checked against the row when popped.
+        if TIMING_COLUMNS & set(columns):
+            self.append_rows([(label, df.loc[label].to_dict()) for label in labels])
+
+    def defer(self, entries):
+        with self._lock:
+            for entry in entries:
+                heapq.heappush(self.late, entry)
+
+    def pop_due(self, now, limit=None):
+        now64 = np.datetime64(now, "s")
+        with self._lock:
+            hi = int(np.searchsorted(self.due, now64, side="right"))
+            if limit is not None:
+                hi = min(hi, self.cursor + limit)
+            items = list(zip(self.labels[self.cursor:hi].tolist(), self.kinds[self.cursor:hi].tolist()))
+            self.cursor = max(self.cursor, hi)
+            while self.late and self.late[0][0] <= now64 and (limit is None or len(items) < limit):
+                _, label, code = heapq.heappop(self.late)
+                items.append((label, code))
+        return items
+
+    def pending(self):
+        with self._lock:
+            return len(self.due) - self.cursor + len(self.late)
+
+def reminder_queue(df_appts):
+    return cache.derived("appointments", "reminder_queue", ReminderQueue.from_frame, df_appts)
+
+def build_message(row, kind):
+    when = pd.Timestamp(row["slot_start"])
+    day = row["appointment_date"] if pd.notna(row["appointment_date"]) else when.date()
+    at = when.strftime("%I:%M %p")
+    if kind == "forms_sent":
+        subject = "Patient intake forms"
+        body = f"Dear {row['patient_name']},\n\nPlease complete the attached intake form before your appointment with {row['doctor']} on {day} at {at}."
+    else:
+        subject = "Appointment reminder"
+        body = f"Reminder: Hi {row['patient_name']}, your appointment with {row['doctor']} is on {day} at {at}."
+        if kind == "reminder_3":
+            body += " Reply YES to confirm, or tell us why you need to cancel."
+    return {"appointment_id": row["appointment_id"], "kind": kind, "email": row["email"], "phone": row["phone"], "subject": subject, "body": body}
+
+class FileSender:
+    # Local outbox: one JSON line per message, standing in for the SMS/email gateways.
+    def __init__(self, path=None):
+        self.path = path or OUTBOX_DIR / "reminders.jsonl"
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(dict(message, sent_at=datetime.now().isoformat()), default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class MockSender:
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._rng.random() < self.failure_rate:
+                raise SendError("mock delivery failure")
+            self.sent.append(message)
+
+class RateLimiter:
+    # Token bucket shared by all dispatch threads.
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(burst or max(1.0, rate_per_sec))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ReminderEngine:
+    def __init__(self, sender, workers=8, rate_per_sec=None, max_attempts=3, backoff=0.2, batch_size=1000):
+        self.sender = sender
+        self.limiter = RateLimiter(rate_per_sec) if rate_per_sec else None
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self._form_failures = Counter()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reminder")
+        self._run_lock = threading.Lock()
+
+    def _deliver(self, message):
+        for attempt in range(1, self.max_attempts + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                self.sender.send(message)
+                return SENT
+            except Exception:
+                if attempt == self.max_attempts:
+                    return FAILED
+                self.stats["retries"] += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def _prepare(self, appts, queue, items, now, run):
+        # Vectorised per batch: re-check that each item is still pending, active, due (the
+        # appointment may have moved since it was queued) and not superseded, then turn the
+        # survivors into messages.
+        items = list(dict.fromkeys(items))
+        labels = np.array([label for label, _ in items])
+        codes = np.array([code for _, code in items])
+        updates = {}
+        jobs = []
+        for code, kind in enumerate(KINDS):
+            sel = np.flatnonzero(codes == code)
+            if len(sel) == 0:
+                continue
+            rows = appts.loc[labels[sel]]
+            active = rows["status"].astype(str).str.strip().str.lower() != "cancelled"
+            rows = rows[(_is_pending(kind, rows[kind]) & active).to_numpy()]
+            when = _due_times(kind, pd.to_datetime(rows["slot_start"], errors="coerce"), pd.to_datetime(rows["created_at"], errors="coerce"))
+            early = (when > pd.Timestamp(now)).to_numpy()
+            queue.defer((np.datetime64(w, "s"), label, code) for w, label in zip(when[early], rows.index[early]))
+            rows = rows[~early]
+            late = (pd.Timestamp(now) >= pd.to_datetime(rows["slot_start"]) - SUPERSEDED_AT[kind]).to_numpy()
+            run[SKIPPED] += int(late.sum())
+            if kind != "forms_sent":
+                for appointment_id in rows["appointment_id"][late]:
+                    updates.setdefault(appointment_id, {})[kind] = SKIPPED
+            for label, row in zip(rows.index[~late], rows[~late].to_dict("records")):
+                jobs.append((label, row["appointment_id"], kind, build_message(row, kind)))
+        return updates, jobs
+
+    @diag.timed("reminders.run_due")
+    def run_due(self, now=None):
+        now = now or datetime.now()
+        run = Counter()
+        t0 = time.perf_counter()
+        with self._run_lock:
+            appts = load_appointments()
+            queue = reminder_queue(appts)
+            while True:
+                items = queue.pop_due(now, self.batch_size)
+                if not items:
+                    break
+                updates, jobs = self._prepare(appts, queue, items, now, run)
+                for (label, appointment_id, kind, _), status in zip(jobs, self._pool.map(lambda job: self._deliver(job[3]), jobs)):
+                    run[status] += 1
+                    if kind == "forms_sent":
+                        if status == SENT:
+                            self._form_failures.pop(appointment_id, None)
+                            updates.setdefault(appointment_id, {})["forms_sent"] = True
+                        else:
+                            self._form_failures[appointment_id] += 1
+                            delay = min(FORMS_RETRY * 2 ** (self._form_failures[appointment_id] - 1), FORMS_RETRY_MAX)
+                            queue.defer([(np.datetime64(now + delay, "s"), label, KINDS.index(kind))])
+                    else:
+                        updates.setdefault(appointment_id, {})[kind] = status
+                update_appointments(updates)
+                run["batches"] += 1
+        run["seconds"] = time.perf_counter() - t0
+        self.stats.update(run)
+        return dict(run)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+def start_background(engine, interval=60.0):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                engine.run_due()
+            except Exception:
+                # A bad pass (storage busy, malformed row) must not end the loop.
+                logging.getLogger("scheduler.reminders").exception("reminder run failed")
+    threading.Thread(target=loop, name="reminder-loop", daemon=True).start()
+    return stop
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+def default_engine():
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = ReminderEngine(FileSender())
+        return _default_engine
@@ -0,0 +1,217 @@
+import io
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from data_layer import cache, load_appointments, load_schedules, load_schedule_rules
+from diagnostics import diag
+from scheduling import schedule_rules
+
+# Counters kept per (doctor, location, month). Everything a report shows is a sum of these
+# plus the scheduled capacity, so rolling up years of appointments touches a few thousand
+# keys instead of every row.
+FIELDS = ["appointments", "cancelled", "no_show", "new", "returning", "booked_min"]
+REPORT_COLS = ["appointments", "active", "new", "returning", "new_share", "cancelled", "cancellation_rate", "no_show", "no_show_rate", "booked_hours", "capacity_hours", "utilization"]
+NO_SHOW = "no_show"
+CANCELLED = "cancelled"
+# Columns whose change moves an appointment between counters.
+STAT_COLUMNS = {"doctor", "location", "visit_type", "slot_start", "slot_end", "status"}
+
+def normalize_status(v):
+    s = "" if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v).strip().lower().replace("-", "_").replace(" ", "_")
+    return NO_SHOW if s in ("no_show", "noshow") else s
+
+def _month(ts):
+    # "" when the appointment has no usable start.
+    return "" if pd.isna(ts) else f"{ts.year:04d}-{ts.month:02d}"
+
+def _contribution(status, visit_type, minutes):
+    # The counter deltas of one appointment, in FIELDS order.
+    if status == CANCELLED:
+        return (1, 1, 0, 0, 0, 0)
+    new = str(visit_type).strip().lower() == "new"
+    return (1, 0, int(status == NO_SHOW), int(new), int(not new), minutes)
+
+class AppointmentStats:
+    def __init__(self):
+        self.totals = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        stats = cls()
+        if df.empty:
+            return stats
+        starts = pd.to_datetime(df["slot_start"], errors="coerce")
+        minutes = ((pd.to_datetime(df["slot_end"], errors="coerce") - starts).dt.total_seconds() // 60).fillna(0).clip(lower=0).astype(int)
+        status = df["status"].map(normalize_status)
+        active = status != CANCELLED
+        new = df["visit_type"].astype(str).str.strip().str.lower() == "new"
+        parts = pd.DataFrame({
+            "doctor": df["doctor"], "location": df["location"], "month": starts.dt.strftime("%Y-%m").fillna("").astype(object),
+            "appointments": 1, "cancelled": (~active).astype(int), "no_show": (active & (status == NO_SHOW)).astype(int),
+            "new": (active & new).astype(int), "returning": (active & ~new).astype(int), "booked_min": minutes.where(active, 0),
+        })
+        sums = parts.groupby(["doctor", "location", "month"], dropna=False)[FIELDS].sum()
+        stats.totals = {key: list(map(int, values)) for key, values in zip(sums.index, sums.to_numpy())}
+        keys = zip(parts["doctor"], parts["location"], parts["month"])
+        stats._rows = dict(zip(df.index, zip(keys, zip(*(parts[f].to_numpy().tolist() for f in FIELDS)))))
+        return stats
+
+    def _add(self, key, contribution, sign):
+        values = self.totals.setdefault(key, [0] * len(FIELDS))
+        for i, v in enumerate(contribution):
+            values[i] += sign * v
+        if not values[0]:
+            del self.totals[key]
+
+    def _set(self, label, doctor, location, visit_type, start, end, status):
+        old = self._rows.pop(label, None)
+        if old is not None:
+            self._add(*old, -1)
+        start, end = pd.to_datetime(start, errors="coerce"), pd.to_datetime(end, errors="coerce")
+        minutes = 0 if pd.isna(start) or pd.isna(end) else max(0, int((end - start).total_seconds() // 60))
+        row = ((doctor, location, _month(start)), _contribution(normalize_status(status), visit_type, minutes))
+        self._rows[label] = row
+        self._add(*row, 1)
+
+    def append_rows(self, rows):
+        with self._lock:
+            for label, row in rows:
+                self._set(label, row.get("doctor"), row.get("location"), row.get("visit_type"), row.get("slot_start"), row.get("slot_end"), row.get("status"))
+
+    def update_rows(self, df, labels, columns):
+        if not STAT_COLUMNS & set(columns):
+            return
+        with self._lock:
+            for label in labels:
+                row = df.loc[label]
+                self._set(label, row["doctor"], row["location"], row["visit_type"], row["slot_start"], row["slot_end"], row["status"])
+
+    def frame(self):
+        with self._lock:
+            items = list(self.totals.items())
+        return pd.DataFrame([(*key, *values) for key, values in items], columns=["doctor", "location", "month", *FIELDS])
+
+class ScheduleCapacity:
+    # Scheduled minutes per (doctor, location, month) from slot rows, plus the days those rows
+    # cover so template days are not counted twice. Booking only flips `available`, which
+    # capacity ignores, so this lives as long as the schedules frame.
+    def __init__(self, minutes, covered):
+        self.minutes = minutes
+        self.covered = covered
+
+    @classmethod
+    def from_frame(cls, df):
+        if df.empty:
+            return cls({}, frozenset())
+        starts = pd.to_datetime(df["slot_start"], errors="coerce")
+        minutes = (pd.to_datetime(df["slot_end"], errors="coerce") - starts).dt.total_seconds() // 60
+        ok = minutes.notna() & (minutes > 0)
+        days = pd.to_datetime(df["date"], errors="coerce").dt.date
+        parts = pd.DataFrame({"doctor": df["doctor"].astype(object), "location": df["location"].astype(object), "month": starts.dt.strftime("%Y-%m"), "day": days, "minutes": minutes})[ok]
+        sums = parts.groupby(["doctor", "location", "month"])["minutes"].sum()
+        covered = frozenset(parts[["doctor", "location", "day"]].drop_duplicates().itertuples(index=False, name=None))
+        return cls({key: int(v) for key, v in sums.items()}, covered)
+
+class TemplateCapacity:
+    # Minutes a month of weekly templates opens, expanded on first use and memoized per
+    # (doctor, location, month) until the rules or the slot rows change.
+    def __init__(self, rules):
+        self.rules = rules
+        self._memo = {}
+        self._covered = None
+        self._lock = threading.Lock()
+
+    def minutes(self, doctor, location, month, covered):
+        with self._lock:
+            if covered is not self._covered:
+                self._memo.clear()
+                self._covered = covered
+            key = (doctor, location, month)
+            if key not in self._memo:
+                first = date(int(month[:4]), int(month[5:]), 1)
+                last = (pd.Timestamp(first) + pd.offsets.MonthEnd(0)).date()
+                total = 0
+                for day in self.rules.dates(doctor, location, first, last):
+                    if (doctor, location, day) in covered:
+                        continue
+                    slots = self.rules.slots(doctor, location, day)
+                    if slots is not None:
+                        total += int((slots[1] - slots[0]).sum() // np.timedelta64(60, "s"))
+                self._memo[key] = total
+            return self._memo[key]
+
+def _months(first, last):
+    return [p.strftime("%Y-%m") for p in pd.period_range(first, last, freq="M")]
+
+def rollup(stats, capacity, templates=None, first=None, last=None):
+    # One row per (doctor, location, month) in [first, last] ("YYYY-MM"); the range defaults
+    # to the months that have appointments or slot rows.
+    df = stats.frame()
+    cap = pd.DataFrame([(*k, v) for k, v in capacity.minutes.items()], columns=["doctor", "location", "month", "capacity_min"])
+    df = df.merge(cap, on=["doctor", "location", "month"], how="outer")
+    df = df[df["month"] != ""]
+    months = sorted(df["month"])
+    first, last = first or (months[0] if months else None), last or (months[-1] if months else None)
+    if first is None or last is None:
+        return df
+    df = df[(df["month"] >= first) & (df["month"] <= last)]
+    if templates is not None and len(templates.rules):
+        extra = [(doc, loc, m, templates.minutes(doc, loc, m, capacity.covered)) for doc, loc in templates.rules.pairs() for m in _months(first, last)]
+        extra = pd.DataFrame([e for e in extra if e[3]], columns=["doctor", "location", "month", "template_min"])
+        df = df.merge(extra, on=["doctor", "location", "month"], how="outer")
+        df["capacity_min"] = df["capacity_min"].fillna(0) + df["template_min"].fillna(0)
+        df = df.drop(columns="template_min")
+    df[FIELDS + ["capacity_min"]] = df[FIELDS + ["capacity_min"]].fillna(0).astype(int)
+    return df.sort_values(["doctor", "location", "month"], ignore_index=True)
+
+def summarize(df, by):
+    # Totals and rates per `by` column(s) of a rollup.
+    out = df.groupby(by, dropna=False)[FIELDS + ["capacity_min"]].sum()
+    active = out["appointments"] - out["cancelled"]
+    out["active"] = active
+    out["new_share"] = (out["new"] / active.where(active > 0)).round(3)
+    out["cancellation_rate"] = (out["cancelled"] / out["appointments"].where(out["appointments"] > 0)).round(3)
+    out["no_show_rate"] = (out["no_show"] / active.where(active > 0)).round(3)
+    out["booked_hours"] = (out["booked_min"] / 60).round(1)
+    out["capacity_hours"] = (out["capacity_min"] / 60).round(1)
+    out["utilization"] = (out["booked_min"] / out["capacity_min"].where(out["capacity_min"] > 0)).round(3)
+    return out[REPORT_COLS].reset_index()
+
+def report_tables(df):
+    return {
+        "By doctor": summarize(df, ["doctor"]),
+        "By location": summarize(df, ["location"]),
+        "By month": summarize(df, ["month"]),
+        "Doctor by month": summarize(df, ["doctor", "location", "month"]),
+    }
+
+def to_workbook_bytes(tables):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        for name, table in tables.items():
+            table.to_excel(writer, sheet_name=name, index=False)
+    return buf.getvalue()
+
+def appointment_stats():
+    return cache.derived("appointments", "stats", AppointmentStats.from_frame, load_appointments())
+
+def _month_arg(value, name):
+    # "YYYY-MM" (or anything pandas reads as a month) to "YYYY-MM"; None stays open-ended.
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return pd.Period(str(value).strip(), "M").strftime("%Y-%m")
+    except ValueError:
+        raise ValueError(f"{name} must be a month like 2025-09, got {value!r}") from None
+
+@diag.timed("reports.admin_report")
+def admin_report(first=None, last=None):
+    first, last = _month_arg(first, "first"), _month_arg(last, "last")
+    if first and last and first > last:
+        raise ValueError(f"first ({first}) is after last ({last})")
+    capacity = cache.derived("schedules", "capacity", ScheduleCapacity.from_frame, load_schedules())
+    templates = cache.derived("schedule_rules", "capacity", lambda df: TemplateCapacity(schedule_rules()), load_schedule_rules())
+    return report_tables(rollup(appointment_stats(), capacity, templates, first, last))
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+from booked_index import IntervalIndex
+from data_layer import transaction, load_schedules, load_appointments, reserve_many, set_slots_available, update_appointments, append_schedule_rules
+from diagnostics import diag
+from scheduling import SLOT_STEP_MIN, SlotConflict, booked_intervals, schedule_rules, slot_index, _frame_lock
+from slot_engine import batch_candidate_starts
+from slot_index import CONFLICT, FREE
+
+def appointments_for_day(df_appts, doctor, day, location=None):
+    if df_appts.empty:
+        return []
+    mask = (df_appts["doctor"] == doctor) & (pd.to_datetime(df_appts["appointment_date"], errors="coerce").dt.date == day)
+    mask &= df_appts["status"].astype(str).str.strip().str.lower() != "cancelled"
+    if location is not None:
+        mask &= df_appts["location"] == location
+    return list(df_appts.index[mask])
+
+def _busy_by_patient(df_appts, patient_ids, moving):
+    # Other active appointments of the affected patients, so nobody is moved on top of themselves.
+    rows = df_appts[df_appts["patient_id"].isin(patient_ids) & ~df_appts.index.isin(moving)]
+    rows = rows[rows["status"].astype(str).str.strip().str.lower() != "cancelled"]
+    busy = {}
+    for pid, s, e in zip(rows["patient_id"], pd.to_datetime(rows["slot_start"]), pd.to_datetime(rows["slot_end"])):
+        busy.setdefault(pid, []).append((s, e))
+    return busy
+
+class _Pool:
+    # Candidate starts for one (doctor, location, duration) filter across all matching days,
+    # in the order SlotIndex.search would return them. Planning only ever books, so a
+    # candidate that stops being free (or whose doctor gets booked elsewhere) never frees up
+    # again and the cursor only moves forward.
+    def __init__(self, index, keys, duration, step_min):
+        self.days = [index.get(*k) for k in keys]
+        self.keys = keys
+        pos, begins, finishes = batch_candidate_starts(self.days, duration, step_min)
+        order = np.lexsort((pos, begins))
+        self.pos = pos[order]
+        self.begins = begins[order]
+        self.finishes = finishes[order]
+        self.cursor = 0
+
+    def take(self, busy, doctor_busy):
+        i = self.cursor
+        while i < len(self.pos):
+            day_slots = self.days[self.pos[i]]
+            begin, finish = self.begins[i].astype(object), self.finishes[i].astype(object)
+            if day_slots.check(begin, finish) != FREE or doctor_busy(self.keys[self.pos[i]][0], begin, finish):
+                if i == self.cursor:
+                    self.cursor += 1
+            elif not any(s < finish and begin < e for s, e in busy):
+                return self.keys[self.pos[i]], begin, finish, day_slots.book(begin, finish)
+            i += 1
+        return None
+
+def plan(df_sched, df_appts, labels, start_day, end_day=None, doctor=None, location=None, step_min=SLOT_STEP_MIN):
+    # Greedy earliest-fit in original appointment order, booking each choice in the slot
+    # index as it goes so later appointments cannot land on it. doctor/location None keep
+    # each appointment's own doctor (any location); pass "*" to allow any doctor or location.
+    index = slot_index(df_sched)
+    rows = df_appts.loc[labels].sort_values("slot_start", kind="stable")
+    busy = _busy_by_patient(df_appts, set(rows["patient_id"]), labels)
+    # A doctor's appointments at other locations (except the ones being moved) and the moves
+    # planned so far, since the slot index only sees bookings at its own location.
+    booked = booked_intervals()
+    moving = set(labels)
+    planned = IntervalIndex()
+
+    def doctor_busy(doc, begin, finish):
+        if planned.overlapping(doc, begin, finish):
+            return True
+        return any(label not in moving for label in booked.conflicts(doc, None, begin, finish)["doctor"])
+
+    pools = {}
+    moves, unplaced = [], []
+    for label, row in rows.iterrows():
+        duration = int((pd.Timestamp(row["slot_end"]) - pd.Timestamp(row["slot_start"])).total_seconds() // 60)
+        want = (row["doctor"] if doctor is None else (None if doctor == "*" else doctor), None if location in (None, "*") else location, duration)
+        if want not in pools:
+            pools[want] = _Pool(index, index.day_keys(start_day, end_day, want[0], want[1]), duration, step_min)
+        own = busy.setdefault(row["patient_id"], [])
+        taken = pools[want].take(own, doctor_busy)
+        if taken is None:
+            unplaced.append(row["appointment_id"])
+            continue
+        (doc, loc, day), begin, finish, booked_rows = taken
+        own.append((begin, finish))
+        planned.add(doc, begin, finish, label)
+        moves.append((label, row, {"doctor": doc, "location": loc, "date": day, "slot_start": begin, "slot_end": finish}, booked_rows))
+    return moves, unplaced
+
+@diag.timed("rescheduling.reschedule")
+def reschedule(labels, start_day, end_day=None, doctor=None, location=None, close=None, require_all=False, step_min=SLOT_STEP_MIN):
+    # Moves the given appointment rows to open slots of the same length in one transaction.
+    # `close` lists (doctor, location, date) days taken off the schedule first (a cancelled
+    # clinic day); otherwise the old slots are released. Any failure rolls everything back:
+    # storage via the transaction, the in-memory frames and indexes via the cache bump.
+    # Excel storage has no rollback, so nothing is written until the new slots are reserved.
+    df_sched = load_schedules()
+    df_appts = load_appointments()
+    index = slot_index(df_sched)
+    with transaction():
+        closed, closed_rules = [], []
+        for key in close or ():
+            day_slots = index.get(*key)
+            if day_slots is not None and len(day_slots):
+                # Recorded as a rule for every day: template days have no slot rows to close,
+                # and on slot-row days it keeps a later cancellation from reopening the slots.
+                closed_rules.append({"kind": "closed", "doctor": key[0], "location": key[1], "date_from": key[2], "date_to": key[2], "note": "day cancelled"})
+                day_slots.available[:] = False
+                closed.append((*key, day_slots.starts[0].astype(object), day_slots.ends[-1].astype(object), day_slots.rows))
+        moves, unplaced = plan(df_sched, df_appts, labels, start_day, end_day, doctor, location, step_min)
+        if unplaced and require_all:
+            raise SlotConflict(CONFLICT)
+        booked, released = [], []
+        rules = schedule_rules()
+        for _, row, slot, _ in moves:
+            booked.append((slot["doctor"], slot["location"], slot["date"], slot["slot_start"], slot["slot_end"]))
+            old = (row["doctor"], row["location"], pd.Timestamp(row["appointment_date"]).date(), pd.Timestamp(row["slot_start"]).to_pydatetime(), pd.Timestamp(row["slot_end"]).to_pydatetime())
+            if (not close or old[:3] not in close) and not rules.closed_on(*old):
+                released.append(old)
+        with _frame_lock:
+            for *_, rows in closed:
+                df_sched.loc[rows, "available"] = False
+            for _, _, _, booked_rows in moves:
+                df_sched.loc[booked_rows, "available"] = False
+            for r in released:
+                day_slots = index.get(*r[:3])
+                if day_slots is not None:
+                    df_sched.loc[day_slots.release(r[3], r[4]), "available"] = True
+        if not reserve_many(df_sched, booked):
+            raise SlotConflict(CONFLICT)
+        # The new slots never overlap the closed or released ones (planning ran before either
+        # was freed), so this order is safe.
+        if closed_rules:
+            append_schedule_rules(closed_rules)
+        if closed:
+            set_slots_available(df_sched, [c[:5] for c in closed], False)
+        if released:
+            set_slots_available(df_sched, released, True)
+        update_appointments({
+            row["appointment_id"]: {
+                "doctor": slot["doctor"], "location": slot["location"], "appointment_date": slot["date"],
+                "slot_start": slot["slot_start"], "slot_end": slot["slot_end"],
+                "reminder_1": "pending", "reminder_2": "pending", "reminder_3": "pending",
+            }
+            for _, row, slot, _ in moves
+        })
+    return {
+        "moved": [{"appointment_id": row["appointment_id"], "from": pd.Timestamp(row["slot_start"]).to_pydatetime(), "to": slot["slot_start"], "doctor": slot["doctor"], "location": slot["location"]} for _, row, slot, _ in moves],
+        "unplaced": unplaced,
+    }
+
+def reschedule_day(doctor, day, start_day=None, end_day=None, location=None, any_doctor=False, require_all=False):
+    # A doctor cancels `day`: close it and move everything booked on it.
+    df_appts = load_appointments()
+    labels = appointments_for_day(df_appts, doctor, day, location)
+    close = slot_index(load_schedules()).day_keys(day, day, doctor, location)
+    return reschedule(labels, start_day or day, end_day, "*" if any_doctor else None, None, close, require_all)
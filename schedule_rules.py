@@ -0,0 +1,181 @@
+import threading
+from datetime import date, datetime, time, timedelta
+import numpy as np
+import pandas as pd
+
+RULE_COLS = ["kind","doctor","location","weekday","date_from","date_to","start_time","end_time","slot_min","note"]
+WEEKLY = "weekly"
+CLOSED = "closed"
+DEFAULT_SLOT_MIN = 30
+HORIZON_DAYS = 366
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+def _blank(v):
+    return v is None or (not isinstance(v, str) and pd.isna(v)) or (isinstance(v, str) and not v.strip())
+
+def parse_weekday(v):
+    if _blank(v):
+        return None
+    s = str(v).strip().lower()
+    try:
+        n = int(float(s))
+    except ValueError:
+        return WEEKDAYS.index(s[:3]) if s[:3] in WEEKDAYS else None
+    return n if 0 <= n <= 6 else None
+
+def parse_minutes(v):
+    # Minutes from midnight of "09:30", a time/datetime cell, or an Excel day fraction.
+    if _blank(v):
+        return None
+    if isinstance(v, (time, datetime)):
+        return v.hour * 60 + v.minute
+    if isinstance(v, (float, np.floating)) and 0 <= v <= 1:
+        return int(round(v * 1440))
+    try:
+        h, _, m = str(v).strip().partition(":")
+        minutes = int(h) * 60 + int(m[:2] or 0)
+    except ValueError:
+        return None
+    return minutes if 0 <= minutes <= 1440 else None
+
+def parse_slot_min(v):
+    if _blank(v):
+        return DEFAULT_SLOT_MIN
+    try:
+        return int(float(str(v).strip()))
+    except (ValueError, OverflowError):
+        return None
+
+def _day(v):
+    if _blank(v):
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    d = pd.to_datetime(v, errors="coerce")
+    return None if pd.isna(d) else d.date()
+
+def _name(v):
+    return None if _blank(v) else str(v).strip()
+
+def clean_rules(df):
+    # Normalised rule rows and the number rejected. Weekly rows need doctor, location, weekday
+    # and a session start before its end; closed rows need a first date and apply to every
+    # doctor / location left blank.
+    df = df.rename(columns=lambda c: str(c).strip())
+    rows = []
+    rejected = 0
+    for rec in df.reindex(columns=RULE_COLS).to_dict("records"):
+        weekday = parse_weekday(rec["weekday"])
+        kind = str(rec["kind"]).strip().lower() if not _blank(rec["kind"]) else (WEEKLY if weekday is not None else CLOSED)
+        start, end = parse_minutes(rec["start_time"]), parse_minutes(rec["end_time"])
+        step = parse_slot_min(rec["slot_min"])
+        row = {
+            "kind": kind, "doctor": _name(rec["doctor"]), "location": _name(rec["location"]), "weekday": weekday,
+            "date_from": _day(rec["date_from"]), "date_to": _day(rec["date_to"]),
+            "start_time": None if start is None else f"{start // 60:02d}:{start % 60:02d}",
+            "end_time": None if end is None else f"{end // 60:02d}:{end % 60:02d}",
+            "slot_min": step, "note": _name(rec["note"]),
+        }
+        if step is None:
+            ok = False
+        elif kind == WEEKLY:
+            ok = row["doctor"] and row["location"] and weekday is not None and start is not None and end is not None and step > 0 and start + step <= end
+        else:
+            ok = kind == CLOSED and row["date_from"] is not None and (start is None) == (end is None) and (start is None or start < end)
+        if ok and row["date_to"] is not None and row["date_from"] is not None and row["date_to"] < row["date_from"]:
+            ok = False
+        if ok:
+            rows.append(row)
+        else:
+            rejected += 1
+    return pd.DataFrame(rows, columns=RULE_COLS, dtype=object), rejected
+
+class ScheduleRules:
+    # Weekly clinic sessions per (doctor, location) plus closures (holidays, leave), expanded
+    # into slots one doctor-day at a time instead of being stored as a row per slot.
+    def __init__(self):
+        self.weekly = {}
+        self.closed = {}
+        self._until = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        rules = cls()
+        rules._add(clean_rules(df)[0])
+        return rules
+
+    def append_rows(self, rows):
+        self._add(clean_rules(pd.DataFrame([dict(row) for _, row in rows]))[0])
+
+    def _add(self, df):
+        with self._lock:
+            for rec in df.to_dict("records"):
+                start, end = parse_minutes(rec["start_time"]), parse_minutes(rec["end_time"])
+                if rec["kind"] == WEEKLY:
+                    key = (rec["doctor"], rec["location"])
+                    sessions = self.weekly.setdefault(key, [[] for _ in WEEKDAYS])
+                    sessions[int(rec["weekday"])].append((start, end, int(rec["slot_min"]), rec["date_from"], rec["date_to"]))
+                    ends = [s[4] for day in sessions for s in day]
+                    self._until[key] = None if None in ends else max(ends)
+                else:
+                    self.closed.setdefault(rec["doctor"], []).append((rec["location"], rec["date_from"], rec["date_to"] or rec["date_from"], start, end))
+
+    def __len__(self):
+        return len(self.weekly)
+
+    def pairs(self):
+        return list(self.weekly)
+
+    def dates(self, doctor, location, start_day, end_day=None):
+        # Days in [start_day, end_day] with a weekly session, in order; open-ended templates
+        # stop HORIZON_DAYS after start_day. Closures are applied when a day is expanded.
+        sessions = self.weekly.get((doctor, location))
+        if not sessions:
+            return
+        until = self._until[(doctor, location)]
+        last = end_day or until or start_day + timedelta(days=HORIZON_DAYS)
+        if until is not None:
+            last = min(last, until)
+        day = start_day
+        while day <= last:
+            if any((lo is None or lo <= day) and (hi is None or day <= hi) for _, _, _, lo, hi in sessions[day.weekday()]):
+                yield day
+            day += timedelta(days=1)
+
+    def closed_on(self, doctor, location, day, start_dt=None, end_dt=None):
+        # True when a closure covers the doctor at `location` on `day` (and, for a partial
+        # closure, overlaps [start_dt, end_dt)). Applies to slot-row days too.
+        begin = None if start_dt is None else start_dt.hour * 60 + start_dt.minute
+        finish = None if end_dt is None else (end_dt - datetime.combine(day, time())).total_seconds() // 60
+        for loc, lo, hi, cs, ce in self.closed.get(doctor, []) + self.closed.get(None, []):
+            if (loc is None or loc == location) and lo <= day <= hi:
+                if cs is None or begin is None or (begin < ce and cs < finish):
+                    return True
+        return False
+
+    def slots(self, doctor, location, day):
+        # (starts, ends) as datetime64[s] for one day, or None when nothing is open.
+        sessions = self.weekly.get((doctor, location))
+        if not sessions:
+            return None
+        spans = sorted((s, e, step) for s, e, step, lo, hi in sessions[day.weekday()] if (lo is None or lo <= day) and (hi is None or day <= hi))
+        starts, ends = [], []
+        for s, e, step in spans:
+            for m in range(s, e - step + 1, step):
+                # Overlapping sessions keep the earlier slot.
+                if not ends or m >= ends[-1]:
+                    starts.append(m)
+                    ends.append(m + step)
+        for loc, lo, hi, cs, ce in self.closed.get(doctor, []) + self.closed.get(None, []):
+            if (loc is None or loc == location) and lo <= day <= hi:
+                if cs is None:
+                    return None
+                keep = [i for i in range(len(starts)) if not (starts[i] < ce and cs < ends[i])]
+                starts, ends = [starts[i] for i in keep], [ends[i] for i in keep]
+        if not starts:
+            return None
+        base = np.datetime64(day, "s")
+        return base + np.array(starts) * np.timedelta64(60, "s"), base + np.array(ends) * np.timedelta64(60, "s")
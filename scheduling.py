@@ -0,0 +1,148 @@
+import threading
+import pandas as pd
+from booked_index import BookedIntervals
+from data_layer import cache, transaction, reserve_slots, set_slots_available, load_appointments, load_schedule_rules
+from diagnostics import diag
+from slot_index import SlotIndex, FREE, CONFLICT, UNAVAILABLE
+from patient_index import PatientIndex
+from schedule_rules import ScheduleRules
+
+NEW_MIN = 60
+RETURN_MIN = 30
+SLOT_STEP_MIN = 30
+FIRST_AVAILABLE_LIMIT = 10
+BOOKED = "booked"
+OVERLAP = "overlap"
+OVERLAP_COLS = ["kind", "doctor", "patient_id", "patient_name", "appointment_id", "location", "slot_start", "slot_end", "other_appointment_id", "other_location", "other_start", "other_end"]
+
+class SlotConflict(Exception):
+    pass
+
+_day_locks = {}
+_day_locks_guard = threading.Lock()
+_frame_lock = threading.Lock()
+
+def _day_lock(doctor, location, day):
+    with _day_locks_guard:
+        return _day_locks.setdefault((doctor, location, day), threading.Lock())
+
+def visit_duration(is_returning):
+    return RETURN_MIN if is_returning else NEW_MIN
+
+def patient_index(df_patients):
+    return cache.derived("patients", "patient_index", PatientIndex.from_frame, df_patients)
+
+@diag.timed("scheduling.find_patient")
+def find_patient(df, first, last, dob):
+    if df.empty:
+        return None
+    label = patient_index(df).lookup(first, last, dob)
+    return df.loc[label] if label is not None else None
+
+@diag.timed("scheduling.similar_patients")
+def similar_patients(df, first, last, dob, limit=5):
+    if df.empty:
+        return df.iloc[0:0]
+    return df.loc[patient_index(df).similar(first, last, dob, limit)]
+
+def schedule_rules():
+    return cache.derived("schedule_rules", "rules", ScheduleRules.from_frame, load_schedule_rules())
+
+def booked_intervals():
+    return cache.derived("appointments", "booked", BookedIntervals.from_frame, load_appointments())
+
+@diag.timed("scheduling.booking_conflict")
+def booking_conflict(doctor, patient_id, start_dt, end_dt):
+    # OVERLAP when the patient already has an active appointment in the range, CONFLICT
+    # when the doctor does (at any location), else None.
+    found = booked_intervals().conflicts(doctor, patient_id, start_dt, end_dt)
+    if found["patient"]:
+        return OVERLAP
+    if found["doctor"]:
+        return CONFLICT
+    return None
+
+@diag.timed("scheduling.overlap_report")
+def overlap_report():
+    # Doctor double bookings and patient self-overlaps among active appointments, one row
+    # per overlapping pair.
+    df = load_appointments()
+    rows = []
+    for kind, _, a, b in booked_intervals().overlaps():
+        first, other = df.loc[a], df.loc[b]
+        rows.append({
+            "kind": kind, "doctor": first["doctor"] if kind == "doctor" else f'{first["doctor"]} / {other["doctor"]}',
+            "patient_id": first["patient_id"] if kind == "patient" else None, "patient_name": first["patient_name"],
+            "appointment_id": first["appointment_id"], "location": first["location"], "slot_start": first["slot_start"], "slot_end": first["slot_end"],
+            "other_appointment_id": other["appointment_id"], "other_location": other["location"], "other_start": other["slot_start"], "other_end": other["slot_end"],
+        })
+    return pd.DataFrame(rows, columns=OVERLAP_COLS)
+
+def slot_index(df_sched):
+    index = cache.derived("schedules", "slot_index", SlotIndex.from_frame, df_sched)
+    index.use_rules(schedule_rules(), booked_intervals)
+    return index
+
+def providers(df_sched):
+    # Doctors and locations with slot rows or weekly templates, for pickers.
+    pairs = schedule_rules().pairs()
+    doctors = set(df_sched["doctor"].dropna()) | {d for d, _ in pairs}
+    locations = set(df_sched["location"].dropna()) | {l for _, l in pairs}
+    return sorted(doctors), sorted(locations)
+
+@diag.timed("scheduling.slots_for_doctor")
+def slots_for_doctor(df_sched, doctor, location, day, duration_min):
+    day_slots = slot_index(df_sched).get(doctor, location, day)
+    if day_slots is None:
+        return []
+    diag.count("rows_scanned", len(day_slots), "slots")
+    return day_slots.free_blocks(duration_min)
+
+@diag.timed("scheduling.slot_options")
+def slot_options(df_sched, doctor, location, day, duration_min, step_min=SLOT_STEP_MIN):
+    day_slots = slot_index(df_sched).get(doctor, location, day)
+    if day_slots is None:
+        return []
+    diag.count("rows_scanned", len(day_slots), "slots")
+    return day_slots.candidates(duration_min, step_min)
+
+@diag.timed("scheduling.next_available")
+def next_available(df_sched, duration_min, start_day, end_day=None, doctor=None, location=None, limit=FIRST_AVAILABLE_LIMIT, not_before=None):
+    return slot_index(df_sched).search(duration_min, start_day, end_day, doctor, location, limit, SLOT_STEP_MIN, not_before)
+
+@diag.timed("scheduling.book_slot")
+def book_slot(df_sched, doctor, location, day, start_dt, end_dt):
+    # Returns BOOKED, CONFLICT (a slot in the range is already taken) or UNAVAILABLE
+    # (the range is not covered by the schedule). Lock order is always storage
+    # transaction first, then the doctor-day lock.
+    day_slots = slot_index(df_sched).get(doctor, location, day)
+    if day_slots is None:
+        return UNAVAILABLE
+    with transaction(), _day_lock(doctor, location, day):
+        state = day_slots.check(start_dt, end_dt)
+        if state != FREE:
+            return state
+        rows = day_slots.book(start_dt, end_dt)
+        with _frame_lock:
+            df_sched.loc[rows, "available"] = False
+        if not reserve_slots(df_sched, doctor, location, day, start_dt, end_dt):
+            day_slots.release(start_dt, end_dt)
+            with _frame_lock:
+                df_sched.loc[rows, "available"] = True
+            return CONFLICT
+    return BOOKED
+
+@diag.timed("scheduling.release_slot")
+def release_slot(df_sched, doctor, location, day, start_dt, end_dt):
+    # Frees the slots of a cancelled appointment for rebooking, unless the day (or that part
+    # of it) is closed: a closed slot-row day is stored as unavailable rows, like a booked one.
+    if schedule_rules().closed_on(doctor, location, day, start_dt, end_dt):
+        return
+    day_slots = slot_index(df_sched).get(doctor, location, day)
+    if day_slots is None:
+        return
+    with transaction(), _day_lock(doctor, location, day):
+        rows = day_slots.release(start_dt, end_dt)
+        with _frame_lock:
+            df_sched.loc[rows, "available"] = True
+        set_slots_available(df_sched, [(doctor, location, day, start_dt, end_dt)], True)
@@ -0,0 +1,52 @@
+import numpy as np
+
+def free_runs(starts, ends, available, groups=None):
+    # Run-length detection over the availability vector: a run breaks where a free
+    # slot does not start at the previous free slot's end, or where the group changes.
+    idx = np.flatnonzero(available)
+    if len(idx) == 0:
+        empty = np.empty(0, dtype=starts.dtype)
+        return empty, empty, (np.empty(0, dtype=np.int64) if groups is not None else None)
+    s = starts[idx]
+    e = ends[idx]
+    breaks = s[1:] != e[:-1]
+    if groups is not None:
+        g = groups[idx]
+        breaks |= g[1:] != g[:-1]
+    cut = np.flatnonzero(breaks) + 1
+    first = np.concatenate(([0], cut))
+    last = np.concatenate((cut - 1, [len(idx) - 1]))
+    return s[first], e[last], (g[first] if groups is not None else None)
+
+def fit_starts(run_starts, run_ends, duration_min, step_min):
+    dur = np.timedelta64(duration_min, "m")
+    step = np.timedelta64(step_min, "m")
+    slack = run_ends - run_starts - dur
+    counts = np.where(slack >= np.timedelta64(0, "m"), slack // step + 1, 0)
+    run_of = np.repeat(np.arange(len(counts)), counts)
+    first_pos = np.cumsum(counts) - counts
+    k = np.arange(len(run_of)) - first_pos[run_of]
+    begins = run_starts[run_of] + k * step
+    return run_of, begins, begins + dur
+
+def candidate_starts(starts, ends, available, duration_min, step_min=30):
+    run_starts, run_ends, _ = free_runs(starts, ends, available)
+    _, begins, finishes = fit_starts(run_starts, run_ends, duration_min, step_min)
+    return begins, finishes
+
+def batch_candidate_starts(days, duration_min, step_min=30):
+    # days: sequence of DaySlots. Returns (day position, start, end) arrays for all of them in one pass.
+    if not days:
+        empty = np.empty(0, dtype="datetime64[s]")
+        return np.empty(0, dtype=np.int64), empty, empty
+    lens = np.fromiter((len(d) for d in days), dtype=np.int64, count=len(days))
+    groups = np.repeat(np.arange(len(days)), lens)
+    starts = np.concatenate([d.starts for d in days])
+    ends = np.concatenate([d.ends for d in days])
+    available = np.concatenate([d.available for d in days])
+    run_starts, run_ends, run_groups = free_runs(starts, ends, available, groups)
+    run_of, begins, finishes = fit_starts(run_starts, run_ends, duration_min, step_min)
+    return run_groups[run_of], begins, finishes
+
+def to_datetimes(values):
+    return values.astype("datetime64[s]").astype(object).tolist()
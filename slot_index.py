@@ -0,0 +1,200 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+import numpy as np
+from diagnostics import diag
+from slot_engine import free_runs, candidate_starts, to_datetimes
+
+FREE = "free"
+CONFLICT = "conflict"
+UNAVAILABLE = "unavailable"
+
+class DaySlots:
+    # Slots of one (doctor, location, date), sorted by start. Slots never overlap,
+    # so ends are sorted too and overlap lookups are two binary searches.
+    __slots__ = ("starts", "ends", "available", "rows")
+
+    def __init__(self, starts, ends, available, rows):
+        self.starts = starts
+        self.ends = ends
+        self.available = available
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping(self, start_dt, end_dt):
+        lo = np.searchsorted(self.ends, np.datetime64(start_dt, "s"), side="right")
+        hi = np.searchsorted(self.starts, np.datetime64(end_dt, "s"), side="left")
+        return slice(lo, max(lo, hi))
+
+    def free_blocks(self, duration_min):
+        run_starts, run_ends, _ = free_runs(self.starts, self.ends, self.available)
+        keep = (run_ends - run_starts) >= np.timedelta64(duration_min, "m")
+        return [(s.astype(object).time(), e.astype(object).time()) for s, e in zip(run_starts[keep], run_ends[keep])]
+
+    def candidates(self, duration_min, step_min=30):
+        begins, finishes = candidate_starts(self.starts, self.ends, self.available, duration_min, step_min)
+        return list(zip(to_datetimes(begins), to_datetimes(finishes)))
+
+    def check(self, start_dt, end_dt):
+        hit = self.overlapping(start_dt, end_dt)
+        if hit.start == hit.stop:
+            return UNAVAILABLE
+        s = self.starts[hit]
+        e = self.ends[hit]
+        if s[0] > np.datetime64(start_dt, "s") or e[-1] < np.datetime64(end_dt, "s") or (s[1:] != e[:-1]).any():
+            return UNAVAILABLE
+        if not self.available[hit].all():
+            return CONFLICT
+        return FREE
+
+    def book(self, start_dt, end_dt):
+        hit = self.overlapping(start_dt, end_dt)
+        self.available[hit] = False
+        return self.rows[hit]
+
+    def release(self, start_dt, end_dt):
+        hit = self.overlapping(start_dt, end_dt)
+        self.available[hit] = True
+        return self.rows[hit]
+
+def _day_stream(dates, lo, hi, doctor, location):
+    for day in islice(dates, lo, hi):
+        yield day, doctor, location
+
+def _rule_stream(rules, listed, start_day, end_day, doctor, location):
+    for day in rules.dates(doctor, location, start_day, end_day):
+        if (doctor, location, day) not in listed:
+            yield day, doctor, location
+
+class SlotIndex:
+    def __init__(self, days):
+        self.days = days
+        self.dates = {}
+        for doctor, location, day in days:
+            self.dates.setdefault((doctor, location), []).append(day)
+        for dates in self.dates.values():
+            dates.sort()
+        self.rules = None
+        self.booked = None
+        self._rules_source = None
+        self._generated = {}
+        self._lock = threading.Lock()
+
+    def use_rules(self, rules, booked):
+        # Weekly templates fill in the doctor-days that have no slot rows; listed days always
+        # win. `booked()` returns the BookedIntervals overlay, consulted when a day is expanded.
+        if rules is self._rules_source:
+            return
+        with self._lock:
+            self._rules_source = rules
+            self.rules = rules if len(rules) else None
+            self.booked = booked
+            self._generated = {}
+
+    def _generate(self, key):
+        # Expanded on first use and kept, so bookings made through the DaySlots stick.
+        with self._lock:
+            if key in self._generated:
+                return self._generated[key]
+            with diag.span("slots.expand"):
+                times = self.rules.slots(*key)
+            day_slots = None
+            if times is not None:
+                diag.count("slots_generated", len(times[0]), "templates")
+                day_slots = DaySlots(times[0], times[1], np.ones(len(times[0]), dtype=bool), np.empty(0, dtype=np.int64))
+                for s, e in self.booked().get(*key):
+                    day_slots.available[day_slots.overlapping(s, e)] = False
+            self._generated[key] = day_slots
+            return day_slots
+
+    @classmethod
+    @diag.timed("slots.index_build")
+    def from_frame(cls, df_sched):
+        days = {}
+        if df_sched.empty:
+            return cls(days)
+        df = df_sched.dropna(subset=["date", "slot_start", "slot_end"])
+        df = df.sort_values(["doctor", "location", "date", "slot_start"], kind="stable")
+        starts = df["slot_start"].to_numpy(dtype="datetime64[s]")
+        ends = df["slot_end"].to_numpy(dtype="datetime64[s]")
+        available = df["available"].to_numpy(dtype=bool)
+        rows = df.index.to_numpy()
+        for key, pos in df.groupby(["doctor", "location", "date"], sort=False).indices.items():
+            part = slice(pos[0], pos[-1] + 1)
+            days[key] = DaySlots(starts[part], ends[part], available[part].copy(), rows[part])
+        return cls(days)
+
+    def get(self, doctor, location, day):
+        day_slots = self.days.get((doctor, location, day))
+        if day_slots is None and self.rules is not None:
+            return self._generate((doctor, location, day))
+        return day_slots
+
+    def keys(self):
+        return self.days.keys()
+
+    def is_generated(self, key):
+        return key not in self.days and self.rules is not None and self.get(*key) is not None
+
+    def _rule_days(self, start_day, end_day, doctor, location):
+        streams = []
+        for doc, loc in self.rules.pairs() if self.rules is not None else ():
+            if (doctor is not None and doc != doctor) or (location is not None and loc != location):
+                continue
+            streams.append(_rule_stream(self.rules, self.days, start_day, end_day, doc, loc))
+        return streams
+
+    def day_keys(self, start_day, end_day=None, doctor=None, location=None):
+        # Every (doctor, location, date) in range that has slots, listed or generated.
+        keys = []
+        for (doc, loc), dates in self.dates.items():
+            if (doctor is not None and doc != doctor) or (location is not None and loc != location):
+                continue
+            lo = bisect_left(dates, start_day)
+            hi = bisect_right(dates, end_day) if end_day is not None else len(dates)
+            keys.extend((doc, loc, day) for day in dates[lo:hi])
+        for stream in self._rule_days(start_day, end_day, doctor, location):
+            keys.extend((doc, loc, day) for day, doc, loc in stream if self.get(doc, loc, day) is not None)
+        return sorted(keys)
+
+    def search(self, duration_min, start_day, end_day=None, doctor=None, location=None, limit=5, step_min=30, not_before=None):
+        # Merge the per doctor/location date lists chronologically and stop as soon as
+        # the earliest `limit` starts are known; days outside the range are never touched,
+        # and template days are only expanded once the merge reaches them.
+        streams = []
+        for (doc, loc), dates in self.dates.items():
+            if (doctor is not None and doc != doctor) or (location is not None and loc != location):
+                continue
+            lo = bisect_left(dates, start_day)
+            hi = bisect_right(dates, end_day) if end_day is not None else len(dates)
+            if lo < hi:
+                streams.append(_day_stream(dates, lo, hi, doc, loc))
+        streams.extend(self._rule_days(start_day, end_day, doctor, location))
+        cutoff = np.datetime64(not_before, "s") if not_before is not None else None
+        found = []
+        day_found = []
+        current = None
+        scanned = 0
+        for day, doc, loc in heapq.merge(*streams):
+            if day != current:
+                found.extend(sorted(day_found))
+                day_found = []
+                if len(found) >= limit:
+                    break
+                current = day
+            slots = self.get(doc, loc, day)
+            if slots is None or not slots.available.any():
+                continue
+            scanned += len(slots)
+            begins, finishes = candidate_starts(slots.starts, slots.ends, slots.available, duration_min, step_min)
+            if cutoff is not None:
+                keep = begins >= cutoff
+                begins, finishes = begins[keep], finishes[keep]
+            for b, e in zip(to_datetimes(begins), to_datetimes(finishes)):
+                day_found.append((b, doc, loc, day, e))
+        found.extend(sorted(day_found))
+        diag.count("rows_scanned", scanned, "slots")
+        return [{"doctor": doc, "location": loc, "date": day, "slot_start": b, "slot_end": e} for b, doc, loc, day, e in found[:limit]]
@@ -0,0 +1,416 @@
+import io
+import os
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from diagnostics import diag
+from schedule_rules import RULE_COLS, ScheduleRules
+from slot_index import FREE, DaySlots
+
+DATA_DIR = Path("data")
+PATIENTS_CSV = DATA_DIR / "patients.csv"
+SCHEDULE_XLSX = DATA_DIR / "doctor_schedules.xlsx"
+APPTS_XLSX = DATA_DIR / "appointments.xlsx"
+RULES_XLSX = DATA_DIR / "schedule_rules.xlsx"
+SQLITE_DB = Path(os.environ.get("SCHEDULER_DB", str(DATA_DIR / "scheduler.db")))
+SCHEDULE_SNAPSHOT = Path(os.environ.get("SCHEDULER_SNAPSHOT", str(DATA_DIR / "schedules.npz")))
+
+PATIENT_COLS = ["patient_id","first_name","last_name","dob","email","phone","city","state","zip","insurance_carrier","member_id","group_number","is_returning"]
+SCHEDULE_COLS = ["doctor","location","date","slot_start","slot_end","available"]
+APPT_COLS = ["appointment_id","created_at","patient_id","patient_name","dob","email","phone","city","state","zip","doctor","location","visit_type","appointment_date","slot_start","slot_end","insurance_carrier","member_id","group_number","status","forms_sent","reminder_1","reminder_2","reminder_3","cancellation_reason"]
+
+TABLE_COLS = {"patients": PATIENT_COLS, "schedules": SCHEDULE_COLS, "appointments": APPT_COLS, "schedule_rules": RULE_COLS}
+UPSERT_KEYS = {"patients": ["patient_id"], "schedules": ["doctor","location","date","slot_start"], "appointments": ["appointment_id"], "schedule_rules": ["kind","doctor","location","weekday","date_from","start_time"]}
+
+def as_bool(series):
+    if series.dtype == bool:
+        return series
+    return series.astype(str).str.strip().str.lower().isin(["true","1","1.0","yes","y"])
+
+def coerce_patients(df):
+    if "dob" in df.columns:
+        df["dob"] = pd.to_datetime(df["dob"], errors="coerce").dt.date
+    if "is_returning" in df.columns:
+        df["is_returning"] = as_bool(df["is_returning"])
+    return df
+
+def coerce_schedules(df):
+    df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
+    df["slot_start"] = pd.to_datetime(df["slot_start"], errors="coerce")
+    df["slot_end"] = pd.to_datetime(df["slot_end"], errors="coerce")
+    df["available"] = as_bool(df["available"])
+    return df
+
+def coerce_appointments(df):
+    if "appointment_date" in df.columns:
+        df["appointment_date"] = pd.to_datetime(df["appointment_date"], errors="coerce").dt.date
+    for col in ["created_at","dob","slot_start","slot_end"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    if "forms_sent" in df.columns:
+        df["forms_sent"] = as_bool(df["forms_sent"])
+    return df
+
+def coerce_rules(df):
+    for col in ["date_from","date_to"]:
+        df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+    return df
+
+COERCE = {"patients": coerce_patients, "schedules": coerce_schedules, "appointments": coerce_appointments, "schedule_rules": coerce_rules}
+
+def _file_stamp(path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def to_excel_bytes(df):
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False, engine="openpyxl")
+    return buf.getvalue()
+
+def merge_upsert(base, chunk, table):
+    # Rows in `chunk` replace rows of `base` with the same key; a slot already booked in
+    # `base` stays booked even if the incoming row says it is available.
+    keys = UPSERT_KEYS[table]
+    combined = pd.concat([base, chunk], ignore_index=True)
+    merged = combined.drop_duplicates(subset=keys, keep="last").reset_index(drop=True)
+    if table == "schedules":
+        booked = combined.loc[~combined["available"].astype(bool), keys].drop_duplicates()
+        if not booked.empty:
+            hit = merged[keys].merge(booked.assign(_booked=True), on=keys, how="left")["_booked"].notna().to_numpy()
+            merged.loc[hit, "available"] = False
+    return merged
+
+class ExcelStorage:
+    name = "excel"
+
+    def __init__(self):
+        # _lock serialises transactions; _files only guards file I/O and is never held while
+        # waiting on another lock, since the frame cache reads under its own lock.
+        self._lock = threading.RLock()
+        self._files = threading.Lock()
+        self._staged = {}
+
+    def _path(self, table):
+        return {"patients": PATIENTS_CSV, "schedules": SCHEDULE_XLSX, "appointments": APPTS_XLSX, "schedule_rules": RULES_XLSX}[table]
+
+    def stamp(self, table):
+        with self._files:
+            return _file_stamp(self._path(table))
+
+    def read(self, table):
+        path = self._path(table)
+        with self._files:
+            if not path.exists():
+                return pd.DataFrame(columns=TABLE_COLS[table])
+            with diag.span(f"storage.read.{table}"):
+                if table == "patients":
+                    df = pd.read_csv(path)
+                else:
+                    df = pd.read_excel(path, engine="openpyxl")
+        diag.count("rows_read", len(df), table)
+        return COERCE[table](df)
+
+    def write(self, table, df):
+        # Written next to the target and renamed over it, so a reader in another process
+        # never opens a half-written workbook.
+        path = self._path(table)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with self._files, diag.span(f"storage.write.{table}"):
+            try:
+                if table == "patients":
+                    df.to_csv(tmp, index=False)
+                else:
+                    df.to_excel(tmp, index=False, engine="openpyxl")
+                os.replace(tmp, path)
+            finally:
+                if tmp.exists():
+                    tmp.unlink()
+        diag.count("files_written", 1, path.name)
+        diag.count("rows_written", len(df), table)
+
+    def append(self, table, df, rows):
+        self.write(table, df)
+
+    def _mark(self, ranges, available, check):
+        # Applied to the workbook on disk rather than by writing the caller's frame, which may
+        # have been loaded before another thread's booking; like the SQLite rows, the file is
+        # the source of truth.
+        with self._lock:
+            current = self.read("schedules")
+            hits = []
+            for doctor, location, day, start_dt, end_dt in ranges:
+                hit = (current["doctor"] == doctor) & (current["location"] == location) & (current["date"] == day) & (current["slot_start"] < end_dt) & (current["slot_end"] > start_dt)
+                if check and not current.loc[hit, "available"].all():
+                    return False
+                hits.append(hit)
+            for hit in hits:
+                current.loc[hit, "available"] = available
+            self.write("schedules", current)
+            return True
+
+    @diag.timed("storage.reserve")
+    def reserve(self, df_sched, doctor, location, day, start_dt, end_dt):
+        return self._mark([(doctor, location, day, start_dt, end_dt)], False, True)
+
+    @diag.timed("storage.reserve_many")
+    def reserve_many(self, df_sched, ranges):
+        return self._mark(ranges, False, True)
+
+    @diag.timed("storage.set_available")
+    def set_available(self, df_sched, ranges, available):
+        self._mark(ranges, available, False)
+
+    def update(self, table, df, key, updates):
+        self.write(table, df)
+
+    def upsert(self, table, df):
+        # Workbooks cannot be patched in place, so chunks are merged in memory and written once on flush().
+        with self._lock:
+            base = self._staged.get(table)
+            self._staged[table] = merge_upsert(self.read(table) if base is None else base, df, table)
+
+    def flush(self):
+        with self._lock:
+            for table, df in self._staged.items():
+                self.write(table, df)
+            self._staged.clear()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield None
+
+def _sql_value(v):
+    if v is None:
+        return None
+    if isinstance(v, (pd.Timestamp, datetime)):
+        return None if pd.isna(v) else v.isoformat(sep=" ")
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, (bool, np.bool_)):
+        return int(v)
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        return None if np.isnan(v) else float(v)
+    if not isinstance(v, str) and pd.isna(v):
+        return None
+    return v
+
+class _Taken(Exception):
+    pass
+
+class SqliteStorage:
+    # One small transaction per booking instead of rewriting whole workbooks.
+    # The CSV/Excel files seed the database on first use and stay available for import/export.
+    name = "sqlite"
+
+    def __init__(self, path=None, seed_from=None):
+        self.path = Path(path or SQLITE_DB)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._written = {}
+        self._written_lock = threading.Lock()
+        self._setup(seed_from or ExcelStorage())
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), isolation_level=None, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _setup(self, seed_from):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._init_lock, self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS patients (%s)" % ", ".join(PATIENT_COLS))
+            conn.execute("CREATE TABLE IF NOT EXISTS schedules (doctor TEXT, location TEXT, date TEXT, slot_start TEXT, slot_end TEXT, available INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS appointments (%s)" % ", ".join(APPT_COLS))
+            conn.execute("CREATE TABLE IF NOT EXISTS schedule_rules (%s)" % ", ".join(RULE_COLS))
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_day ON schedules (doctor, location, date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_id ON appointments (appointment_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (doctor, location, slot_start)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_id ON patients (patient_id)")
+            # A random id per database goes into every stamp, so a deleted and reseeded (or
+            # swapped) database never matches a snapshot or cache entry of the old one.
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('db_id', ?)", (secrets.randbits(62),))
+            self.db_id = conn.execute("SELECT value FROM meta WHERE key = 'db_id'").fetchone()[0]
+            # Each table is seeded once, so tables added later are picked up by existing databases.
+            for table in TABLE_COLS:
+                if conn.execute("SELECT 1 FROM meta WHERE key = ?", (f"version:{table}",)).fetchone() is None:
+                    self._replace(conn, table, seed_from.read(table))
+                    conn.execute("INSERT INTO meta VALUES (?, 0)", (f"version:{table}",))
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            with self._written_lock:
+                self._written.clear()
+            raise
+        conn.commit()
+
+    def _bump(self, conn, table):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (f"version:{table}",))
+        version = conn.execute("SELECT value FROM meta WHERE key = ?", (f"version:{table}",)).fetchone()[0]
+        with self._written_lock:
+            self._written[table] = max(self._written.get(table, 0), version)
+
+    def _insert(self, conn, table, df, target=None):
+        cols = TABLE_COLS[table]
+        df = df.reindex(columns=cols)
+        rows = [tuple(_sql_value(v) for v in rec) for rec in df.itertuples(index=False, name=None)]
+        conn.executemany("INSERT INTO %s (%s) VALUES (%s)" % (target or table, ", ".join(cols), ", ".join("?" * len(cols))), rows)
+
+    def _replace(self, conn, table, df):
+        conn.execute(f"DELETE FROM {table}")
+        self._insert(conn, table, df)
+
+    def stamp(self, table):
+        # Versions this process wrote count even before their transaction commits, so other
+        # threads reading the older committed snapshot don't see the cache as stale.
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (f"version:{table}",)).fetchone()
+        if row is None:
+            return (str(self.path), self.db_id, None)
+        return (str(self.path), self.db_id, max(row[0], self._written.get(table, 0)))
+
+    def read(self, table):
+        with diag.span(f"storage.read.{table}"):
+            df = pd.read_sql_query(f"SELECT {', '.join(TABLE_COLS[table])} FROM {table} ORDER BY rowid", self._conn())
+            diag.count("rows_read", len(df), table)
+            return COERCE[table](df)
+
+    def write(self, table, df):
+        with diag.span(f"storage.write.{table}"), self.transaction() as conn:
+            self._replace(conn, table, df)
+            self._bump(conn, table)
+        diag.count("rows_written", len(df), table)
+
+    def append(self, table, df, rows):
+        cols = TABLE_COLS[table]
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO %s (%s) VALUES (%s)" % (table, ", ".join(cols), ", ".join("?" * len(cols))), [tuple(_sql_value(row.get(c)) for c in cols) for row in rows])
+            self._bump(conn, table)
+        diag.count("rows_written", len(rows), table)
+
+    def update(self, table, df, key, updates):
+        groups = {}
+        for k, fields in updates.items():
+            groups.setdefault(tuple(sorted(fields)), []).append((k, fields))
+        with self.transaction() as conn:
+            for cols, items in groups.items():
+                conn.executemany(
+                    f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in cols)} WHERE {key} = ?",
+                    [tuple(_sql_value(fields[c]) for c in cols) + (k,) for k, fields in items],
+                )
+            self._bump(conn, table)
+        diag.count("rows_written", len(updates), table)
+
+    def upsert(self, table, df):
+        # Stage the chunk in a temp table, then update matching rows and insert the rest
+        # in one transaction. Booked slots stay booked.
+        cols = TABLE_COLS[table]
+        keys = UPSERT_KEYS[table]
+        staged = f"staged_{table}"
+        match = " AND ".join(f"{table}.{k} IS s.{k}" for k in keys)
+        if table == "schedules":
+            sets = "slot_end = s.slot_end, available = schedules.available AND s.available"
+        else:
+            sets = ", ".join(f"{c} = s.{c}" for c in cols if c not in keys)
+        with self.transaction() as conn:
+            conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staged} AS SELECT {', '.join(cols)} FROM {table} WHERE 0")
+            conn.execute(f"DELETE FROM {staged}")
+            self._insert(conn, table, df, target=staged)
+            conn.execute(f"UPDATE {table} SET {sets} FROM {staged} AS s WHERE {match}")
+            conn.execute(f"INSERT INTO {table} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM {staged} AS s WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match})")
+            self._bump(conn, table)
+        diag.count("rows_written", len(df), table)
+
+    def flush(self):
+        pass
+
+    def _template_open(self, conn, doctor, location, day, start_dt, end_dt):
+        # The doctor's rules (and clinic-wide closures) as committed, expanded for the day the
+        # same way the slot index does; the range must be a run of generated slots.
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(RULE_COLS)} FROM schedule_rules WHERE doctor IS NULL OR TRIM(doctor) IN ('', ?)",
+            conn, params=(doctor,),
+        )
+        times = ScheduleRules.from_frame(COERCE["schedule_rules"](df)).slots(doctor, location, day)
+        if times is None:
+            return False
+        day_slots = DaySlots(times[0], times[1], np.ones(len(times[0]), dtype=bool), np.empty(0, dtype=np.int64))
+        return day_slots.check(start_dt, end_dt) == FREE
+
+    def _reserve(self, conn, doctor, location, day, start_dt, end_dt):
+        where = "doctor = ? AND location = ? AND date = ? AND slot_start < ? AND ? < slot_end"
+        args = (doctor, location, _sql_value(day), _sql_value(end_dt), _sql_value(start_dt))
+        if conn.execute(f"SELECT COUNT(*) FROM schedules WHERE {where} AND available = 0", args).fetchone()[0]:
+            return False
+        if conn.execute(f"UPDATE schedules SET available = 0 WHERE {where}", args).rowcount > 0:
+            return True
+        if conn.execute("SELECT 1 FROM schedules WHERE doctor = ? AND location = ? AND date = ? LIMIT 1", args[:3]).fetchone():
+            return False
+        # No slot rows for the day: only bookable if the weekly templates open it (and no
+        # closure covers the range), and then the appointments are the record of what is booked.
+        if not self._template_open(conn, doctor, location, day, start_dt, end_dt):
+            return False
+        return not conn.execute(
+            "SELECT COUNT(*) FROM appointments WHERE doctor = ? AND location = ? AND slot_start < ? AND ? < slot_end AND COALESCE(status, '') != 'cancelled'",
+            (doctor, location, _sql_value(end_dt), _sql_value(start_dt)),
+        ).fetchone()[0]
+
+    @diag.timed("storage.reserve")
+    def reserve(self, df_sched, doctor, location, day, start_dt, end_dt):
+        # Check-and-set under the database write lock: the in-memory view may be stale
+        # if another process booked first, so the rows themselves are the source of truth.
+        with self.transaction() as conn:
+            if not self._reserve(conn, doctor, location, day, start_dt, end_dt):
+                return False
+            self._bump(conn, "schedules")
+        return True
+
+    @diag.timed("storage.reserve_many")
+    def reserve_many(self, df_sched, ranges):
+        # All or nothing. Inside an enclosing transaction the caller must roll back on False.
+        try:
+            with self.transaction() as conn:
+                for doctor, location, day, start_dt, end_dt in ranges:
+                    if not self._reserve(conn, doctor, location, day, start_dt, end_dt):
+                        raise _Taken()
+                self._bump(conn, "schedules")
+        except _Taken:
+            return False
+        return True
+
+    @diag.timed("storage.set_available")
+    def set_available(self, df_sched, ranges, available):
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE schedules SET available = ? WHERE doctor = ? AND location = ? AND date = ? AND slot_start < ? AND ? < slot_end",
+                [(int(available), doctor, location, _sql_value(day), _sql_value(end_dt), _sql_value(start_dt)) for doctor, location, day, start_dt, end_dt in ranges],
+            )
+            self._bump(conn, "schedules")
+
+ENGINES = {"excel": ExcelStorage, "sqlite": SqliteStorage}
+
+def open_storage(name=None):
+    return ENGINES[(name or os.environ.get("SCHEDULER_STORAGE", "sqlite")).lower()]()